@@ -1,41 +1,66 @@
+"""
+The widgets, the reader and the sample data of the filament-toolbox.
+
+They are imported when they are first used, so that importing the package,
+as napari does at startup and to find the reader, does not import the
+image processing libraries the widgets use.
+"""
+
+import importlib
+
 try:
     from ._version import version as __version__
 except ImportError:
     __version__ = "unknown"
 
 
-from ._reader import napari_get_reader
-from ._sample_data import make_sample_data
-from ._widget import activate
-from ._widget import AnisotropicDiffusionFilterWidget
-from ._widget import BrightestPathTracingWidget
-from ._widget import ClearBorderWidget
-from ._widget import ClosingWidget
-from ._widget import DilationWidget
-from ._widget import ErosionWidget
-from ._widget import EuclideanDistanceTransformWidget
-from ._widget import FrangiFilterWidget
-from ._widget import GaussianFilterWidget
-from ._widget import HamiltonJacobiSkeletonizeWidget
-from ._widget import IsotropicResamplingWidget
-from ._widget import LabelWidget
-from ._widget import LocalThicknessWidget
-from ._widget import MeasureLabelsWidget
-from ._widget import MeasureSkeletonWidget
-from ._widget import MedialAxisTransformWidget
-from ._widget import MedianFilterWidget
-from ._widget import MeijeringFilterWidget
-from ._widget import MetricsWidget
-from ._widget import OpeningWidget
-from ._widget import PixelClassifierWidget
-from ._widget import RemoveSmallObjectsWidget
-from ._widget import rgb_to_16bit
-from ._widget import rgb_to_8bit
-from ._widget import RollingBallWidget
-from ._widget import SatoFilterWidget
-from ._widget import SkeletonizeWidget
-from ._widget import SubtractImageWidget
-from ._widget import ThresholdWidget
+_MODULES = {
+    "napari_get_reader": "._reader",
+    "make_sample_data": "._sample_data",
+    "activate": "._widget",
+    "AnisotropicDiffusionFilterWidget": "._widget",
+    "BrightestPathTracingWidget": "._widget",
+    "ClearBorderWidget": "._widget",
+    "ClosingWidget": "._widget",
+    "DilationWidget": "._widget",
+    "ErosionWidget": "._widget",
+    "EuclideanDistanceTransformWidget": "._widget",
+    "FrangiFilterWidget": "._widget",
+    "GaussianFilterWidget": "._widget",
+    "HamiltonJacobiSkeletonizeWidget": "._widget",
+    "IsotropicResamplingWidget": "._widget",
+    "LabelWidget": "._widget",
+    "LocalThicknessWidget": "._widget",
+    "MeasureLabelsWidget": "._widget",
+    "MeasureSkeletonWidget": "._widget",
+    "MedialAxisTransformWidget": "._widget",
+    "MedianFilterWidget": "._widget",
+    "MeijeringFilterWidget": "._widget",
+    "MetricsWidget": "._widget",
+    "OpeningWidget": "._widget",
+    "PixelClassifierWidget": "._widget",
+    "RemoveSmallObjectsWidget": "._widget",
+    "rgb_to_16bit": "._widget",
+    "rgb_to_8bit": "._widget",
+    "RollingBallWidget": "._widget",
+    "SatoFilterWidget": "._widget",
+    "SkeletonizeWidget": "._widget",
+    "SubtractImageWidget": "._widget",
+    "ThresholdWidget": "._widget",
+}
+
+
+def __getattr__(name):
+    if name not in _MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_MODULES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_MODULES))
+
 
 __all__ = (
     "napari_get_reader",
@@ -0,0 +1,224 @@
+"""
+The command line interface of the filament-toolbox, to run its operations
+headless, without napari.
+"""
+
+import argparse
+import os
+
+
+def classify(args):
+    from filament_toolbox.lib.batch import BatchPixelClassification
+    from filament_toolbox.lib.batch import get_input_paths
+
+    operation = BatchPixelClassification(
+        args.model, get_input_paths(args.inputs), args.output
+    )
+    operation.n_workers = args.workers
+    operation.calculate_probabilities = args.probabilities
+    operation.run()
+    print(f"Classified {len(operation.result)} images, "
+          f"failed {len(operation.errors)}.")
+    for path, error in operation.errors.items():
+        print(f"Failed: {path}: {error}")
+
+
+def metrics(args):
+    from filament_toolbox.lib.batch import BatchMetrics
+    from filament_toolbox.lib.batch import get_image_pairs
+
+    operation = BatchMetrics(
+        get_image_pairs(args.labels1, args.labels2), args.metrics
+    )
+    operation.n_workers = args.workers
+    operation.run()
+    operation.save(args.output)
+    print(f"Evaluated {len(operation.pairs)} pairs of images.")
+
+
+def run(args):
+    from filament_toolbox.lib.batch import get_input_paths
+    from filament_toolbox.lib.pipeline import Pipeline
+    from filament_toolbox.lib.pipeline import read_image
+
+    pipeline = Pipeline.load(args.pipeline)
+    pipeline.scale = args.scale
+    paths = get_input_paths(args.inputs)
+    for path in paths:
+        pipeline.image = read_image(path)
+        pipeline.run()
+        name = os.path.splitext(os.path.basename(path))[0]
+        pipeline.save_results(args.output, name)
+    print(f"Processed {len(paths)} images.")
+
+
+def batch(args):
+    from filament_toolbox.lib.batch import BatchPipeline
+    from filament_toolbox.lib.batch import get_input_paths
+    from filament_toolbox.lib.pipeline import Pipeline
+
+    operation = BatchPipeline(
+        Pipeline.load(args.pipeline), get_input_paths(args.inputs), args.output
+    )
+    operation.scale = args.scale
+    operation.image_format = args.image_format
+    operation.table_format = args.table_format
+    operation.n_workers = args.workers
+    operation.max_large_jobs = args.large_jobs
+    operation.large_image_bytes = int(args.large_image_size * 2**20)
+    operation.resume = not args.restart
+    operation.run()
+    failed = [
+        path for path, entry in operation.manifest["images"].items()
+        if entry["status"] == "failed"
+    ]
+    print(f"Processed {len(operation.result)} images, "
+          f"skipped {operation.manifest['runs'][-1]['skipped']}, "
+          f"failed {len(failed)}.")
+    for path in failed:
+        print(f"Failed: {path}: {operation.manifest['images'][path]['error']}")
+
+
+def benchmark(args):
+    from filament_toolbox.lib.ml import PixelClassifierBenchmark
+
+    operation = PixelClassifierBenchmark(args.backends or None)
+    operation.run()
+    columns = list(operation.table.keys())
+    print("\t".join(columns))
+    for row in zip(*operation.table.values()):
+        print("\t".join(str(value) for value in row))
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="filament-toolbox",
+        description="Run the tools of the filament-toolbox without napari.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    classify_parser = subparsers.add_parser(
+        "classify", help="apply a saved pixel classifier to images"
+    )
+    classify_parser.add_argument("model", help="the saved classifier")
+    classify_parser.add_argument(
+        "inputs", nargs="+", help="image files, folders or glob patterns"
+    )
+    classify_parser.add_argument(
+        "-o", "--output", required=True, help="the output folder"
+    )
+    classify_parser.add_argument(
+        "-w", "--workers", type=int, default=None,
+        help="the number of worker processes (default: one per cpu)",
+    )
+    classify_parser.add_argument(
+        "-p", "--probabilities", action="store_true",
+        help="also write the probability maps",
+    )
+    classify_parser.set_defaults(func=classify)
+
+    metrics_parser = subparsers.add_parser(
+        "metrics",
+        help="compare pairs of label images, paired by their names",
+    )
+    metrics_parser.add_argument(
+        "labels1", help="a label image, a folder or a glob pattern"
+    )
+    metrics_parser.add_argument(
+        "labels2", help="a label image, a folder or a glob pattern"
+    )
+    metrics_parser.add_argument(
+        "-o", "--output", required=True,
+        help="the results table (.csv or .parquet), the tables of the "
+             "objects of the instance metrics are written next to it",
+    )
+    metrics_parser.add_argument(
+        "-m", "--metrics", nargs="+", default=["Dice", "clDice"],
+        help="the metrics to calculate (Dice, clDice, F1, 'instance clDice')",
+    )
+    metrics_parser.add_argument(
+        "-w", "--workers", type=int, default=None,
+        help="the number of worker processes (default: one per cpu)",
+    )
+    metrics_parser.set_defaults(func=metrics)
+
+    run_parser = subparsers.add_parser(
+        "run", help="apply a pipeline (.json or .yaml) to images"
+    )
+    run_parser.add_argument("pipeline", help="the pipeline file")
+    run_parser.add_argument(
+        "inputs", nargs="+", help="image files, folders or glob patterns"
+    )
+    run_parser.add_argument(
+        "-o", "--output", required=True, help="the output folder"
+    )
+    run_parser.add_argument(
+        "-s", "--scale", type=float, nargs="+", default=None,
+        help="the voxel size, given to the measurements",
+    )
+    run_parser.set_defaults(func=run)
+
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="apply a pipeline to many images in parallel, resuming "
+             "interrupted runs",
+    )
+    batch_parser.add_argument("pipeline", help="the pipeline file")
+    batch_parser.add_argument(
+        "inputs", nargs="+", help="image files, folders or glob patterns"
+    )
+    batch_parser.add_argument(
+        "-o", "--output", required=True,
+        help="the output folder, which also holds the manifest of the run",
+    )
+    batch_parser.add_argument(
+        "-s", "--scale", type=float, nargs="+", default=None,
+        help="the voxel size, given to the measurements",
+    )
+    batch_parser.add_argument(
+        "-w", "--workers", type=int, default=None,
+        help="the number of worker processes (default: one per cpu)",
+    )
+    batch_parser.add_argument(
+        "--large-image-size", type=float, default=1024,
+        help="the file size in MB above which an image is a large job "
+             "(default: 1024)",
+    )
+    batch_parser.add_argument(
+        "--large-jobs", type=int, default=1,
+        help="the number of large jobs run at the same time (default: 1)",
+    )
+    batch_parser.add_argument(
+        "--image-format", choices=["tif", "zarr"], default="tif",
+        help="the format of the output images (default: tif)",
+    )
+    batch_parser.add_argument(
+        "--table-format", choices=["csv", "parquet"], default="csv",
+        help="the format of the output tables (default: csv)",
+    )
+    batch_parser.add_argument(
+        "--restart", action="store_true",
+        help="process all images again instead of skipping the images "
+             "that are done",
+    )
+    batch_parser.set_defaults(func=batch)
+
+    benchmark_parser = subparsers.add_parser(
+        "benchmark",
+        help="compare the pixel classifier backends on synthetic filaments",
+    )
+    benchmark_parser.add_argument(
+        "backends", nargs="*", default=None,
+        help="the backends to compare (default: all)",
+    )
+    benchmark_parser.set_defaults(func=benchmark)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,6 @@ implement multiple readers or even other plugin contributions. see:
 https://napari.org/stable/plugins/building_a_plugin/guides.html#readers
 """
 
-from filament_toolbox.lib.swc import SWCForest
-
 
 def napari_get_reader(path):
     """A basic implementation of a Reader contribution.
@@ -59,6 +57,8 @@ def reader_function(path):
         layer. Both "meta", and "layer_type" are optional. napari will
         default to layer_type=="image" if not provided
     """
+    from filament_toolbox.lib.swc import SWCForest
+
     # handle both a string and a list of strings
     paths = [path] if isinstance(path, str) else path
     forest = SWCForest.read_from(paths)
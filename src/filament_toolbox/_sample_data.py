@@ -20,3 +20,15 @@ def make_sample_data():
     # add_image_kwargs
     # https://napari.org/stable/api/napari.Viewer.html#napari.Viewer.add_image
     return [(numpy.random.rand(512, 512), {})]
+
+
+def make_filament_sample_data():
+    """Generates a 3D image of synthetic filaments and their ground truth"""
+    from filament_toolbox.lib.synthetic import SyntheticFilaments
+
+    filaments = SyntheticFilaments()
+    filaments.run()
+    return [
+        (filaments.result, {"name": "filaments"}),
+        (filaments.labels, {"name": "filaments ground truth"}, "labels"),
+    ]
@@ -12,10 +12,12 @@ from autooptions import OptionsWidget
 from napari.layers import Image
 from napari.layers import Labels
 from napari.qt.threading import create_worker
+from napari.utils import notifications
 from napari.utils.events import Event
-from numba.core.types import uint32
 from qtpy.QtCore import Qt
+from qtpy.QtCore import QTimer
 from qtpy.QtWidgets import QCheckBox
+from qtpy.QtWidgets import QFileDialog
 from qtpy.QtWidgets import QHBoxLayout
 from qtpy.QtWidgets import QPushButton
 from qtpy.QtWidgets import QSlider
@@ -23,6 +25,7 @@ from qtpy.QtWidgets import QVBoxLayout
 from qtpy.QtWidgets import QWidget
 from skimage.color import rgb2gray
 
+from filament_toolbox.lib.cache import RESULT_CACHE
 from filament_toolbox.lib.filter import AnisotropicDiffusionFilter
 from filament_toolbox.lib.filter import FrangiFilter
 from filament_toolbox.lib.filter import GaussianFilter
@@ -30,12 +33,12 @@ from filament_toolbox.lib.filter import MedianFilter
 from filament_toolbox.lib.filter import MeijeringFilter
 from filament_toolbox.lib.filter import RollingBall
 from filament_toolbox.lib.filter import SatoFilter
+from filament_toolbox.lib.histogram import THRESHOLD_METHODS
 from filament_toolbox.lib.icalc import SubtractImage
 from filament_toolbox.lib.measure import MeasureLabels
 from filament_toolbox.lib.measure import MeasureSkeleton
-from filament_toolbox.lib.metric import CenterlineDice
-from filament_toolbox.lib.metric import Dice
-from filament_toolbox.lib.ml import RandomForestPixelClassifier
+from filament_toolbox.lib.metric import METRICS
+from filament_toolbox.lib.metric import MetricsEvaluation
 from filament_toolbox.lib.morphology import Closing
 from filament_toolbox.lib.morphology import Dilation
 from filament_toolbox.lib.morphology import Erosion
@@ -47,7 +50,13 @@ from filament_toolbox.lib.morphology import MedialAxisTransform
 from filament_toolbox.lib.morphology import Opening
 from filament_toolbox.lib.morphology import RemoveSmallObjects
 from filament_toolbox.lib.morphology import Skeletonize
+from filament_toolbox.lib.operation import OutputPolicy
+from filament_toolbox.lib.operation import get_number_of_steps
+from filament_toolbox.lib.operation import release_arrays
+from filament_toolbox.lib.operation import run_steps
+from filament_toolbox.lib.napari_util import LAYER_STATISTICS
 from filament_toolbox.lib.napari_util import NapariUtil
+from filament_toolbox.lib.qtutil import HistogramView
 from filament_toolbox.lib.qtutil import TableView
 from filament_toolbox.lib.qtutil import WidgetTool
 from filament_toolbox.lib.segmentation import ClearBorder
@@ -104,6 +113,30 @@ def str_to_number(s):
 
 
 class SimpleWidget(QWidget):
+    """The base class of the widgets that run an operation with the
+    parameters from an options widget.
+
+    Widgets that support it have a preview mode, in which the operation is
+    run on the visible part of the current slice, padded by previewHalo
+    voxels in all axes, and the result is shown in a single preview layer.
+    The preview is updated when the parameters, the current slice or the
+    camera change, after previewDelay milliseconds without further changes.
+    Only one preview is calculated at a time and a preview that has become
+    stale while it was calculated is dropped.
+
+    The result is handed over to napari following outputPolicy: results
+    can be converted to another type, labels only to integer types that
+    hold all of them, the layer of a previous result of the same name can
+    be updated instead of a new layer being added and the arrays of the
+    operation are released once the result is displayed. The results of
+    widgets with cacheResults are also kept in the shared result cache,
+    whose memory is bounded by outputPolicy.cache_bytes, so that applying
+    the same operation to the same image again is immediate.
+    """
+
+    outputTypes = ["same", "float32", "uint16", "uint8"]
+    previewSupported = True
+    cacheResults = True
 
     def __init__(self, viewer, sameRowSet=None):
         super().__init__()
@@ -114,7 +147,24 @@ class SimpleWidget(QWidget):
         self.sameRowSet = sameRowSet
         self.operation = None
         self.imageLayer = None
+        self.operationWorker = None
+        self.outputPolicy = OutputPolicy()
+        self.outputTypeComboBox = None
+        self.replaceCheckBox = None
+        self.previewCheckBox = None
+        self.previewLayer = None
+        self.previewHalo = 16
+        self.previewDelay = 300
+        self.previewing = False
+        self.previewRegion = None
+        self.previewWorker = None
+        self.previewPending = False
+        self.previewTimer = QTimer(self)
+        self.previewTimer.setSingleShot(True)
+        self.previewTimer.timeout.connect(self.updatePreview)
         self.createLayout()
+        if self.previewSupported:
+            self.connectPreviewTriggers()
 
     def addModesOption(self, options):
         options.addChoice("mode", choices=self.modes, value=self.modes[0])
@@ -128,13 +178,178 @@ class SimpleWidget(QWidget):
             sameRowSet=self.sameRowSet,
         )
         self.widget.addApplyButton(self.apply)
+        self.widget.addButton("Cancel", self.cancelOperation)
         layout = QVBoxLayout()
         layout.addWidget(self.widget)
+        outputLayout = QHBoxLayout()
+        outputTypeLabel, self.outputTypeComboBox = WidgetTool.getComboInput(
+            self, "output type:", self.outputTypes
+        )
+        self.outputTypeComboBox.currentTextChanged.connect(
+            self.onOutputPolicyChanged
+        )
+        self.replaceCheckBox = QCheckBox("replace result layer")
+        self.replaceCheckBox.stateChanged.connect(self.onOutputPolicyChanged)
+        outputLayout.addWidget(outputTypeLabel)
+        outputLayout.addWidget(self.outputTypeComboBox)
+        outputLayout.addWidget(self.replaceCheckBox)
+        layout.addLayout(outputLayout)
+        if self.previewSupported:
+            self.previewCheckBox = QCheckBox("preview visible slice")
+            self.previewCheckBox.stateChanged.connect(self.schedulePreview)
+            layout.addWidget(self.previewCheckBox)
         self.setLayout(layout)
 
+    def onOutputPolicyChanged(self, *args):
+        outputType = self.outputTypeComboBox.currentText()
+        self.outputPolicy.dtype = None if outputType == "same" else outputType
+        self.outputPolicy.replace = self.replaceCheckBox.isChecked()
+
+    def connectPreviewTriggers(self):
+        for checkBox, field in self.widget.widgets.values():
+            if checkBox is not None:
+                checkBox.stateChanged.connect(self.schedulePreview)
+            for signal in ("textEdited", "currentTextChanged", "stateChanged"):
+                if field is not None and hasattr(field, signal):
+                    getattr(field, signal).connect(self.schedulePreview)
+                    break
+        self.viewer.dims.events.current_step.connect(self.schedulePreview)
+        self.viewer.dims.events.ndisplay.connect(self.schedulePreview)
+        self.viewer.camera.events.center.connect(self.schedulePreview)
+        self.viewer.camera.events.zoom.connect(self.schedulePreview)
+
+    def schedulePreview(self, *args):
+        if self.previewCheckBox is None:
+            return
+        if not self.previewCheckBox.isChecked():
+            self.removePreview()
+            return
+        self.previewTimer.start(self.previewDelay)
+
+    def updatePreview(self):
+        """Run apply in preview mode, in which runOperationInThread runs the
+        operation on the visible region instead of the whole image. The
+        operation and the input layer of the last apply are kept."""
+        if self.previewWorker is not None:
+            self.previewPending = True
+            self.previewWorker.quit()
+            return
+        self.readOptionValues()
+        operation, imageLayer = self.operation, self.imageLayer
+        self.previewing = True
+        try:
+            self.apply()
+        finally:
+            self.previewing = False
+            self.operation, self.imageLayer = operation, imageLayer
+
+    def readOptionValues(self):
+        """Copy the values shown in the options widget into the options, as
+        the apply button does, without saving them. Numbers that are still
+        being typed and can not be read keep their last value."""
+        for name, item in self.options.getItems().items():
+            checkBox, field = self.widget.widgets[name]
+            if checkBox is not None and not checkBox.isChecked():
+                self.options.setValue(name, None)
+                continue
+            if item["type"] == "bool":
+                value = field.isChecked()
+            elif item["type"] in ("int", "float"):
+                text = field.text().strip()
+                try:
+                    value = (int if item["type"] == "int" else float)(text or 0)
+                except ValueError:
+                    continue
+            elif hasattr(field, "currentText"):
+                value = field.currentText()
+            else:
+                value = field.text()
+            self.options.setValue(name, value)
+
+    def runPreviewInThread(self, callback):
+        layer = self.imageLayer
+        if layer is None or layer.multiscale:
+            return
+        region = NapariUtil(self.viewer).getVisibleRegion(layer)
+        if region is None:
+            return
+        padded = tuple(
+            slice(max(axisSlice.start - self.previewHalo, 0),
+                  min(axisSlice.stop + self.previewHalo, size))
+            for axisSlice, size in zip(region, layer.data.shape)
+        )
+        inner = tuple(
+            slice(axisSlice.start - paddedSlice.start,
+                  axisSlice.stop - paddedSlice.start)
+            for axisSlice, paddedSlice in zip(region, padded)
+        )
+        operation = self.operation
+        operation.image = np.asarray(layer.data[padded])
+        if hasattr(operation, "use_cache"):
+            operation.use_cache = False     # crops would evict whole images
+        self.previewWorker = create_worker(run_steps, operation)
+        self.previewWorker.returned.connect(
+            lambda _: self.onPreviewCalculated(
+                operation, layer, region, inner, callback
+            )
+        )
+        self.previewWorker.finished.connect(self.onPreviewWorkerFinished)
+        self.previewWorker.start()
+
+    def onPreviewCalculated(self, operation, layer, region, inner, callback):
+        if self.previewPending or not self.previewCheckBox.isChecked():
+            return
+        operation.result = operation.result[inner]
+        saved = self.operation, self.imageLayer
+        self.operation, self.imageLayer = operation, layer
+        self.previewRegion = region
+        try:
+            callback()
+        finally:
+            self.previewRegion = None
+            self.operation, self.imageLayer = saved
+
+    def onPreviewWorkerFinished(self):
+        self.previewWorker = None
+        if self.previewPending:
+            self.previewPending = False
+            self.updatePreview()
+
+    def showPreview(self, name, labels):
+        self.previewLayer = NapariUtil(self.viewer).showPreview(
+            self.previewLayer,
+            self.operation.result,
+            self.imageLayer,
+            self.previewRegion,
+            name + " preview",
+            labels=labels,
+        )
+
+    def removePreview(self):
+        if self.previewLayer is not None and self.previewLayer in self.viewer.layers:
+            self.viewer.layers.remove(self.previewLayer)
+        self.previewLayer = None
+
+    def getLayerToReplace(self, name, layerType):
+        if not self.outputPolicy.replace:
+            return None
+        layer = NapariUtil(self.viewer).getLayerWithName(name)
+        if not isinstance(layer, layerType) or layer is self.imageLayer:
+            return None
+        return layer
+
     def displayImage(self, name, colormap=None):
+        if self.previewRegion is not None:
+            self.showPreview(name, labels=False)
+            return
+        image = self.outputPolicy.convert(self.operation.result)
+        layer = self.getLayerToReplace(name, Image)
+        if layer is not None:
+            NapariUtil.replaceLayerData(layer, image)
+            layer.reset_contrast_limits()
+            return
         self.viewer.add_image(
-            self.operation.result,
+            image,
             name=name,
             scale=self.imageLayer.scale,
             units=self.imageLayer.units,
@@ -143,14 +358,34 @@ class SimpleWidget(QWidget):
         )
 
     def displayLabels(self, name):
+        if self.previewRegion is not None:
+            self.showPreview(name, labels=True)
+            return
+        labels = self.outputPolicy.convert_labels(self.operation.result)
+        layer = self.getLayerToReplace(name, Labels)
+        if layer is not None:
+            NapariUtil.replaceLayerData(layer, labels)
+            return
+        if not labels.flags.writeable:
+            labels = labels.copy()      # cached results are read-only
         self.viewer.add_labels(
-            self.operation.result,
+            labels,
             name=name,
             scale=self.imageLayer.scale,
             units=self.imageLayer.units,
             blending="additive",
         )
 
+    def onOperationCalculated(self, worker, callback):
+        """Display the result, unless the worker has been superseded by a
+        newer run, whose operation has already replaced the operation of
+        the worker."""
+        if worker is not self.operationWorker:
+            return
+        callback()
+        if self.outputPolicy.release:
+            release_arrays(self.operation)
+
     def sigmasChanged(self, value):
         pass  # default implementation does nothing
 
@@ -171,13 +406,43 @@ class SimpleWidget(QWidget):
         )
 
     def runOperationInThread(self, description, callback=None):
+        """Run the operation step by step in a worker thread, with a progress
+        bar advancing at each step. A run that is still going is cancelled,
+        since its result would be superseded by the result of the new run.
+        The callback is only called when the run was not cancelled."""
+        if self.previewing:
+            self.runPreviewInThread(callback)
+            return
+        self.cancelOperation()
+        steps = run_steps
+        if self.cacheResults and self.outputPolicy.cache_bytes > 0:
+            RESULT_CACHE.set_max_bytes(self.outputPolicy.cache_bytes)
+            steps = RESULT_CACHE.run_steps
         worker = create_worker(
-            self.operation.run, _progress={"desc": description}
+            steps,
+            self.operation,
+            _progress={
+                "desc": description,
+                "total": get_number_of_steps(self.operation),
+            },
         )
         if callback is not None:
-            worker.finished.connect(callback)
+            worker.returned.connect(
+                lambda _: self.onOperationCalculated(worker, callback)
+            )
+        worker.finished.connect(lambda: self.onOperationWorkerFinished(worker))
+        self.operationWorker = worker
         worker.start()
 
+    def cancelOperation(self, *args):
+        """Stop the running operation at its next step."""
+        if self.operationWorker is not None:
+            self.operationWorker.quit()
+
+    def onOperationWorkerFinished(self, worker):
+        if self.operationWorker is worker:
+            self.operationWorker = None
+
 
 class MorphologySimpleWidget(SimpleWidget):
 
@@ -270,12 +535,17 @@ class AnisotropicDiffusionFilterWidget(SimpleWidget):
 
 class MeasureSkeletonWidget(SimpleWidget):
 
+    previewSupported = False
+    cacheResults = False
+
     def __init__(self, viewer: "napari.viewer.Viewer"):
         super().__init__(viewer)
 
     def getOptions(self):
         options = Options("Filament Toolbox", "measure_skeleton")
         options.addImage()
+        options.addBool("main branch", True)
+        options.load()
         return options
 
     def apply(self):
@@ -283,6 +553,7 @@ class MeasureSkeletonWidget(SimpleWidget):
         self.operation = MeasureSkeleton(self.imageLayer.data)
         self.operation.scale = self.imageLayer.scale
         self.operation.units = self.imageLayer.units
+        self.operation.findMainBranch = self.options.value("main branch")
         self.runOperationInThread(
             "Measuring Skeleton...", callback=self.displayResult
         )
@@ -331,6 +602,8 @@ class GaussianFilterWidget(SimpleWidget):
 
 class IsotropicResamplingWidget(SimpleWidget):
 
+    previewSupported = False
+
     def __init__(self, viewer: "napari.viewer.Viewer"):
         super().__init__(viewer)
 
@@ -424,6 +697,8 @@ class MedianFilterWidget(SimpleWidget):
 
 class SubtractImageWidget(SimpleWidget):
 
+    previewSupported = False
+
     def __init__(self, viewer: "napari.viewer.Viewer"):
         super().__init__(viewer)
 
@@ -821,6 +1096,8 @@ class RemoveSmallObjectsWidget(SimpleWidget):
 
 class ClearBorderWidget(SimpleWidget):
 
+    previewSupported = False
+
     def __init__(self, viewer: "napari.viewer.Viewer"):
         super().__init__(viewer)
 
@@ -843,6 +1120,8 @@ class ClearBorderWidget(SimpleWidget):
 
 class SkeletonizeWidget(SimpleWidget):
 
+    cacheResults = False    # the skeletons are in the skeleton cache
+
     def __init__(self, viewer: "napari.viewer.Viewer"):
         super().__init__(viewer)
         self.widget.widgets["labels"][1].currentTextChanged.connect(
@@ -912,6 +1191,9 @@ class HamiltonJacobiSkeletonizeWidget(SimpleWidget):
 
 class BrightestPathTracingWidget(SimpleWidget):
 
+    previewSupported = False
+    cacheResults = False
+
     def __init__(self, viewer: "napari.viewer.Viewer"):
         super().__init__(viewer)
 
@@ -945,11 +1227,15 @@ class BrightestPathTracingWidget(SimpleWidget):
 
 class MetricsWidget(SimpleWidget):
 
+    previewSupported = False
+    cacheResults = False
+
     def __init__(self, viewer: "napari.viewer.Viewer"):
-        super().__init__(viewer, sameRowSet={"clDice"})
-        self.metrics = {"Dice": Dice, "clDice": CenterlineDice}
+        super().__init__(viewer, sameRowSet={"clDice", "instance clDice"})
+        self.metrics = METRICS
         self.table = {}
         self.results = {}
+        self.objectTables = {}
         self.layer1 = None
         self.layer2 = None
 
@@ -959,6 +1245,8 @@ class MetricsWidget(SimpleWidget):
         options.addLabels(name="labels 2")
         options.addBool("Dice")
         options.addBool("clDice")
+        options.addBool("F1")
+        options.addBool("instance clDice")
         options.load()
         return options
 
@@ -973,30 +1261,39 @@ class MetricsWidget(SimpleWidget):
         worker.start()
 
     def displayResult(self):
-        if "Metrics" in self.viewer.window.dock_widgets.keys():
+        self.displayTable(self.results, "Metrics")
+        for name, table in self.objectTables.items():
+            self.displayTable(table, "Metrics " + name)
+
+    def displayTable(self, table, name):
+        if name in self.viewer.window.dock_widgets.keys():
             self.viewer.window.remove_dock_widget(
-                self.viewer.window.dock_widgets["Metrics"]
+                self.viewer.window.dock_widgets[name]
             )
-            self.viewer.window.dock_widgets["Metrics"].close()
-        self.viewer.window.add_dock_widget(
-            TableView(self.results), name="Metrics"
-        )
+            self.viewer.window.dock_widgets[name].close()
+        self.viewer.window.add_dock_widget(TableView(table), name=name)
 
     def calculate_metrics(self):
-        if not "image1" in self.results.keys():
-            self.results["image1"] = []
-        self.results["image1"].append(self.layer1.name)
-        if not "image2" in self.results.keys():
-            self.results["image2"] = []
-        self.results["image2"].append(self.layer2.name)
-        for key, value in self.metrics.items():
-            if self.options.value(key):
-                metric_class = self.metrics[key]
-                metric = metric_class(self.layer1.data, self.layer2.data)
-                metric.calculate()
-                if not key in self.results.keys():
-                    self.results[key] = []
-                self.results[key].append(metric.result)
+        """Add a row with the selected metrics to the results. Metrics that
+        were not selected in this or in earlier runs are NaN, so that all
+        columns have a value for each row. The tables of the metrics with a
+        value per object are those of the last run."""
+        selected_metrics = [
+            key for key in self.metrics.keys() if self.options.value(key)
+        ]
+        evaluation = MetricsEvaluation(
+            self.layer1.data, self.layer2.data, selected_metrics
+        )
+        evaluation.run()
+        self.objectTables = evaluation.tables
+        row = {"image1": self.layer1.name, "image2": self.layer2.name}
+        row.update(evaluation.result)
+        nRows = len(self.results.get("image1", []))
+        for key in row.keys():
+            if not key in self.results.keys():
+                self.results[key] = [np.nan] * nRows
+        for key, column in self.results.items():
+            column.append(row.get(key, np.nan))
 
 
 class EuclideanDistanceTransformWidget(SimpleWidget):
@@ -1056,6 +1353,9 @@ class LocalThicknessWidget(SimpleWidget):
 
 class MedialAxisTransformWidget(SimpleWidget):
 
+    previewSupported = False
+    cacheResults = False
+
     def __init__(self, viewer: "napari.viewer.Viewer"):
         super().__init__(viewer)
         self.kimimaroProps = {
@@ -1225,6 +1525,9 @@ class MedialAxisTransformWidget(SimpleWidget):
 
 class MeasureLabelsWidget(SimpleWidget):
 
+    previewSupported = False
+    cacheResults = False
+
     def __init__(self, viewer: "napari.viewer.Viewer"):
         super().__init__(viewer)
         self.widget.addButton("Options", self.optionsButtonPressed)
@@ -1378,9 +1681,25 @@ class ThresholdWidget(ToolboxWidget):
         self.original_cmap = None
         self.original_blending = None
         self.current_layer = None
+        self.statistics = None
+        self.histogram_view = None
+        self.auto_threshold_combo_box = None
+        self.auto_threshold_button = None
+        self.apply_button = None
+        self.preview_check_box = None
+        self.preview_layer = None
+        self.worker = None
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(30)
+        self.preview_timer.timeout.connect(self.update_preview)
         self.create_layout()
         self.image_combo_boxes.append(self.input_layer_combo_box)
         self.update_current_layer()
+        self.viewer.dims.events.current_step.connect(self.schedule_preview)
+        self.viewer.dims.events.ndisplay.connect(self.schedule_preview)
+        self.viewer.camera.events.center.connect(self.schedule_preview)
+        self.viewer.camera.events.zoom.connect(self.schedule_preview)
 
     def create_layout(self):
         main_layout = QVBoxLayout()
@@ -1414,11 +1733,22 @@ class ThresholdWidget(ToolboxWidget):
             self.max_value_input_changed,
         )
 
-        apply_button = QPushButton("&Apply")
-        apply_button.clicked.connect(self.on_apply_button_clicked)
+        self.histogram_view = HistogramView(self)
+        auto_threshold_label, self.auto_threshold_combo_box = (
+            WidgetTool.getComboInput(self, "method:", THRESHOLD_METHODS)
+        )
+        self.auto_threshold_button = QPushButton("Auto")
+        self.auto_threshold_button.clicked.connect(
+            self.on_auto_threshold_button_clicked
+        )
+        self.preview_check_box = QCheckBox("preview visible slice")
+        self.preview_check_box.stateChanged.connect(self.schedule_preview)
+        self.apply_button = QPushButton("&Apply")
+        self.apply_button.clicked.connect(self.on_apply_button_clicked)
         layer_layout = QHBoxLayout()
         min_layout = QHBoxLayout()
         max_layout = QHBoxLayout()
+        auto_threshold_layout = QHBoxLayout()
         button_layout = QHBoxLayout()
 
         layer_layout.addWidget(input_layer_label)
@@ -1429,11 +1759,17 @@ class ThresholdWidget(ToolboxWidget):
         max_layout.addWidget(max_value_label)
         max_layout.addWidget(self.max_value_slider)
         max_layout.addWidget(self.max_value_input)
-        button_layout.addWidget(apply_button)
+        auto_threshold_layout.addWidget(auto_threshold_label)
+        auto_threshold_layout.addWidget(self.auto_threshold_combo_box)
+        auto_threshold_layout.addWidget(self.auto_threshold_button)
+        button_layout.addWidget(self.preview_check_box)
+        button_layout.addWidget(self.apply_button)
 
         main_layout.addLayout(layer_layout)
+        main_layout.addWidget(self.histogram_view)
         main_layout.addLayout(min_layout)
         main_layout.addLayout(max_layout)
+        main_layout.addLayout(auto_threshold_layout)
         main_layout.addLayout(button_layout)
         self.setLayout(main_layout)
 
@@ -1451,13 +1787,16 @@ class ThresholdWidget(ToolboxWidget):
             self.current_layer.colormap = self.original_cmap
             self.current_layer.blending = self.original_blending
         self.current_layer = new_layer
+        self.statistics = None
+        self.set_statistics_ready(False)
+        self.histogram_view.setHistogram([], [])
         self.original_cmap = new_layer.colormap
         self.original_blending = new_layer.blending
         new_layer.colormap = "HiLo"
         new_layer.blending = "additive"
         sliders_min = int(round(new_layer.contrast_limits_range[0]))
         sliders_max = int(round(new_layer.contrast_limits_range[1]))
-        if new_layer.data.dtype in (np.uint8, np.uint16, uint32):
+        if new_layer.data.dtype in (np.uint8, np.uint16, np.uint32):
             sliders_min = np.iinfo(new_layer.data.dtype).min
             sliders_max = np.iinfo(new_layer.data.dtype).max
         self.min_value_slider.setMinimum(sliders_min)
@@ -1473,6 +1812,38 @@ class ThresholdWidget(ToolboxWidget):
             self.max_value_slider.setMinimum(0)
             self.max_value_slider.setMaximum(65535)
             self.max_value_slider.setValue(65535)
+        LAYER_STATISTICS.request(new_layer, self.on_statistics_calculated)
+        self.schedule_preview()
+
+    def on_statistics_calculated(self, statistics):
+        if LAYER_STATISTICS.get(self.current_layer) is not statistics:
+            return
+        self.statistics = statistics
+        self.histogram_view.setHistogram(
+            statistics.histogram, statistics.bin_edges
+        )
+        if "float" in str(self.current_layer.data.dtype):
+            # map the sliders to the data range instead of the fallback range
+            self.max_threshold_changed(self.max_value_slider.value())
+        self.histogram_view.setThresholds(*self.current_layer.contrast_limits)
+        self.set_statistics_ready(True)
+
+    def set_statistics_ready(self, ready):
+        """Enable the buttons that need the range of the data only once the
+        statistics of the current layer are known, so that the threshold
+        is calculated against the same range as the histogram."""
+        tool_tip = "" if ready else "The histogram is still being calculated."
+        for button in (self.auto_threshold_button, self.apply_button):
+            button.setEnabled(ready)
+            button.setToolTip(tool_tip)
+
+    def get_data_range(self):
+        """Answer the minimum and maximum of the data of the current layer,
+        from the cached statistics or, while they are being calculated, from
+        the contrast limits range of the layer."""
+        if self.statistics is not None:
+            return self.statistics.min, self.statistics.max
+        return self.current_layer.contrast_limits_range
 
     def min_threshold_changed(self, value):
         new_value = value
@@ -1487,8 +1858,7 @@ class ThresholdWidget(ToolboxWidget):
             new_value = value - 1
         text = self.input_layer_combo_box.currentText()
         layer = self.napari_util.getLayerWithName(text)
-        data_min = np.min(layer.data)
-        data_max = np.max(layer.data)
+        data_min, data_max = self.get_data_range()
         new_value_float = new_value
         if "float" in str(layer.data.dtype):
             new_value_float = data_min + (
@@ -1501,7 +1871,9 @@ class ThresholdWidget(ToolboxWidget):
             new_value_float,
             max_threshold_value,
         ]
+        self.histogram_view.setThresholds(new_value_float, max_threshold_value)
         self.min_value_input.setText(str(new_value))
+        self.schedule_preview()
 
     def max_threshold_changed(self, value):
         new_value = value
@@ -1516,8 +1888,7 @@ class ThresholdWidget(ToolboxWidget):
             new_value = value + 1
         text = self.input_layer_combo_box.currentText()
         layer = self.napari_util.getLayerWithName(text)
-        data_min = np.min(layer.data)
-        data_max = np.max(layer.data)
+        data_min, data_max = self.get_data_range()
         new_value_float = new_value
         if "float" in str(layer.data.dtype):
             new_value_float = data_min + (
@@ -1530,7 +1901,9 @@ class ThresholdWidget(ToolboxWidget):
             min_threshold_value,
             new_value_float,
         ]
+        self.histogram_view.setThresholds(min_threshold_value, new_value_float)
         self.max_value_input.setText(str(new_value))
+        self.schedule_preview()
 
     def min_value_input_changed(self, value):
         number = str_to_number(value)
@@ -1540,29 +1913,104 @@ class ThresholdWidget(ToolboxWidget):
         number = str_to_number(value)
         self.max_value_slider.setValue(number)
 
-    def on_apply_button_clicked(self):
-        self.input_layer = self.current_layer
-        data_min = np.min(self.input_layer.data)
-        data_max = np.max(self.input_layer.data)
+    def on_auto_threshold_button_clicked(self):
+        if self.statistics is None:
+            notifications.show_info("The histogram is still being calculated.")
+            return
+        method = self.auto_threshold_combo_box.currentText()
+        threshold = self.statistics.get_threshold(method)
+        if "float" in str(self.current_layer.data.dtype):
+            data_min, data_max = self.get_data_range()
+            value_range = (data_max - data_min) or 1
+            slider_value = int(
+                np.ceil((threshold - data_min) / value_range * 65535.0)
+            )
+        else:
+            slider_value = int(np.floor(threshold)) + 1
+        self.max_value_slider.setValue(self.max_value_slider.maximum())
+        self.min_value_slider.setValue(slider_value)
+
+    def get_threshold_values(self):
+        """Answer the lower and the upper threshold in the units of the
+        data of the current layer."""
+        data_min, data_max = self.get_data_range()
         min_value = self.min_value_slider.value()
         max_value = self.max_value_slider.value()
-        if "float" in str(self.input_layer.data.dtype):
+        if "float" in str(self.current_layer.data.dtype):
             min_value = data_min + (
                 (min_value / 65535.0) * (data_max - data_min)
             )
             max_value = data_min + (
                 (max_value / 65535.0) * (data_max - data_min)
             )
+        return min_value, max_value
+
+    def schedule_preview(self, *args):
+        """Update the preview once the events of the current interaction,
+        like the ticks of a slider or the steps of a zoom, have settled."""
+        self.preview_timer.start()
+
+    def update_preview(self):
+        """Threshold only the part of the current slice that is visible in
+        the canvas and display it in the preview layer."""
+        if (
+            not self.preview_check_box.isChecked()
+            or self.current_layer is None
+            or self.current_layer.multiscale
+        ):
+            self.remove_preview()
+            return
+        region = self.napari_util.getVisibleRegion(self.current_layer)
+        if region is None:
+            self.remove_preview()
+            return
+        threshold = Threshold(self.current_layer.data[region])
+        threshold.min_value, threshold.max_value = self.get_threshold_values()
+        threshold.run()
+        self.preview_layer = self.napari_util.showPreview(
+            self.preview_layer,
+            threshold.result,
+            self.current_layer,
+            region,
+            self.current_layer.name + " preview",
+        )
+
+    def remove_preview(self):
+        if self.preview_layer is not None and self.preview_layer in self.viewer.layers:
+            self.viewer.layers.remove(self.preview_layer)
+        self.preview_layer = None
+
+    def on_apply_button_clicked(self):
+        self.input_layer = self.current_layer
+        min_value, max_value = self.get_threshold_values()
         self.filter = Threshold(self.current_layer.data)
         self.filter.min_value = min_value
         self.filter.max_value = max_value
+        if self.worker is not None:
+            self.worker.quit()
         worker = create_worker(
-            self.filter.run, _progress={"desc": "Thresholding image..."}
-        )
-        worker.finished.connect(self.on_operation_finished)
+            run_steps,
+            self.filter,
+            _progress={
+                "desc": "Thresholding image...",
+                "total": get_number_of_steps(self.filter),
+            },
+        )
+        worker.returned.connect(lambda _: self.on_worker_returned(worker))
+        worker.finished.connect(lambda: self.on_worker_finished(worker))
+        self.worker = worker
         worker.start()
 
-    def on_operation_finished(self):
+    def on_worker_returned(self, worker):
+        # a result of a superseded worker can still be queued
+        if worker is self.worker:
+            self.on_operation_finished()
+
+    def on_worker_finished(self, worker):
+        if self.worker is worker:
+            self.worker = None
+
+    def on_operation_finished(self, _=None):
         name = self.input_layer.name + " mask"
         self.viewer.add_labels(
             self.filter.result,
@@ -1571,6 +2019,7 @@ class ThresholdWidget(ToolboxWidget):
             units=self.input_layer.units,
             blending="additive",
         )
+        release_arrays(self.filter)
 
 
 class PixelClassifierWidget(ToolboxWidget):
@@ -1579,12 +2028,17 @@ class PixelClassifierWidget(ToolboxWidget):
         super().__init__(viewer)
         self.point_layers = self.napari_util.getPointsLayers()
         self.point_layer_combo_box = None
+        self.label_layer_combo_box = None
+        self.use_labels_check_box = None
         self.intensity_features = True
         self.edges_features = True
         self.texture_features = True
         self.intensity_check_box = None
         self.edges_check_box = None
         self.texture_check_box = None
+        self.probabilities_check_box = None
+        self.incremental_check_box = None
+        self.backend_combo_box = None
         self.sigma_min = 1
         self.sigma_max = 16
         self.num_sigma = None
@@ -1599,6 +2053,7 @@ class PixelClassifierWidget(ToolboxWidget):
         self.create_layout()
         self.image_combo_boxes.append(self.input_layer_combo_box)
         self.point_combo_boxes.append(self.point_layer_combo_box)
+        self.label_combo_boxes.append(self.label_layer_combo_box)
 
     def create_layout(self):
         main_layout = QVBoxLayout()
@@ -1616,12 +2071,32 @@ class PixelClassifierWidget(ToolboxWidget):
                 self.point_layers,
             )
         )
+        label_layer_label, self.label_layer_combo_box = (
+            WidgetTool.getComboInput(
+                self,
+                "labels:",
+                self.label_layers,
+            )
+        )
+        from filament_toolbox.lib.ml import PixelClassifier
+
+        backend_label, self.backend_combo_box = WidgetTool.getComboInput(
+            self,
+            "classifier:",
+            list(PixelClassifier(None).backends.keys()),
+        )
+        self.use_labels_check_box = QCheckBox("Use labels as annotations")
+        self.use_labels_check_box.setChecked(False)
         self.intensity_check_box = QCheckBox("Intensity features")
         self.intensity_check_box.setChecked(self.intensity_features)
         self.edges_check_box = QCheckBox("Edges Features")
         self.edges_check_box.setChecked(self.edges_features)
         self.texture_check_box = QCheckBox("Texture Features")
         self.texture_check_box.setChecked(self.texture_features)
+        self.probabilities_check_box = QCheckBox("Probability maps")
+        self.probabilities_check_box.setChecked(False)
+        self.incremental_check_box = QCheckBox("Incremental training")
+        self.incremental_check_box.setChecked(False)
         sigma_min_label, self.sigma_min_input = WidgetTool.getLineInput(
             self,
             "sigma min.:",
@@ -1647,6 +2122,10 @@ class PixelClassifierWidget(ToolboxWidget):
         train_button.clicked.connect(self.on_train_button_clicked)
         classify_button = QPushButton("&Classify")
         classify_button.clicked.connect(self.on_classify_button_clicked)
+        save_button = QPushButton("&Save...")
+        save_button.clicked.connect(self.on_save_button_clicked)
+        load_button = QPushButton("&Load...")
+        load_button.clicked.connect(self.on_load_button_clicked)
 
         estimators_label, self.estimators_input = WidgetTool.getLineInput(
             self,
@@ -1664,6 +2143,8 @@ class PixelClassifierWidget(ToolboxWidget):
         )
         layer_layout = QHBoxLayout()
         point_layout = QHBoxLayout()
+        label_layout = QHBoxLayout()
+        backend_layout = QHBoxLayout()
         checkboxes_layout = QVBoxLayout()
         sigma_min_layout = QHBoxLayout()
         sigma_max_layout = QHBoxLayout()
@@ -1676,6 +2157,11 @@ class PixelClassifierWidget(ToolboxWidget):
         layer_layout.addWidget(self.input_layer_combo_box)
         point_layout.addWidget(point_layer_label)
         point_layout.addWidget(self.point_layer_combo_box)
+        label_layout.addWidget(label_layer_label)
+        label_layout.addWidget(self.label_layer_combo_box)
+        backend_layout.addWidget(backend_label)
+        backend_layout.addWidget(self.backend_combo_box)
+        checkboxes_layout.addWidget(self.use_labels_check_box)
         checkboxes_layout.addWidget(self.intensity_check_box)
         checkboxes_layout.addWidget(self.edges_check_box)
         checkboxes_layout.addWidget(self.texture_check_box)
@@ -1685,8 +2171,12 @@ class PixelClassifierWidget(ToolboxWidget):
         sigma_max_layout.addWidget(self.sigma_max_input)
         num_sigma_layout.addWidget(num_sigma_label)
         num_sigma_layout.addWidget(self.num_sigma_input)
+        button_layout.addWidget(self.probabilities_check_box)
+        button_layout.addWidget(self.incremental_check_box)
         button_layout.addWidget(train_button)
         button_layout.addWidget(classify_button)
+        button_layout.addWidget(save_button)
+        button_layout.addWidget(load_button)
         estimators_layout.addWidget(estimators_label)
         estimators_layout.addWidget(self.estimators_input)
         max_depth_layout.addWidget(max_depth_label)
@@ -1694,6 +2184,8 @@ class PixelClassifierWidget(ToolboxWidget):
 
         main_layout.addLayout(layer_layout)
         main_layout.addLayout(point_layout)
+        main_layout.addLayout(label_layout)
+        main_layout.addLayout(backend_layout)
         main_layout.addLayout(checkboxes_layout)
         main_layout.addLayout(sigma_min_layout)
         main_layout.addLayout(sigma_max_layout)
@@ -1731,13 +2223,24 @@ class PixelClassifierWidget(ToolboxWidget):
         estimators = int(self.estimators_input.text().strip())
         max_depth = int(self.max_depth_input.text().strip())
 
-        self.pixelClassifier = RandomForestPixelClassifier(
-            self.input_layer.data
-        )
-        self.pixelClassifier.training_points = point_layer.data
-        self.pixelClassifier.training_points_classes = [
-            str(e) for e in point_layer.face_color
-        ]
+        from filament_toolbox.lib.ml import PixelClassifier
+
+        incremental = self.incremental_check_box.isChecked()
+        if not incremental or not self.pixelClassifier:
+            self.pixelClassifier = PixelClassifier(self.input_layer.data)
+        self.pixelClassifier.backend = self.backend_combo_box.currentText()
+        self.pixelClassifier.image = self.input_layer.data
+        self.pixelClassifier.incremental = incremental
+        self.pixelClassifier.training_labels_image = None
+        if self.use_labels_check_box.isChecked():
+            text = self.label_layer_combo_box.currentText()
+            label_layer = self.napari_util.getLayerWithName(text)
+            self.pixelClassifier.training_labels_image = label_layer.data
+        else:
+            self.pixelClassifier.training_points = point_layer.data
+            self.pixelClassifier.training_points_classes = [
+                str(e) for e in point_layer.face_color
+            ]
         self.pixelClassifier.intensity = use_intensity
         self.pixelClassifier.edges = use_edges
         self.pixelClassifier.texture = use_texture
@@ -1754,20 +2257,36 @@ class PixelClassifierWidget(ToolboxWidget):
         worker.start()
 
     def on_train_finished(self):
-        self.pixelClassifier.predict()
-        name = self.input_layer.name + " labels"
-        self.viewer.add_labels(
-            self.pixelClassifier.result,
-            name=name,
-            scale=self.input_layer.scale,
-            units=self.input_layer.units,
-            blending="additive",
-        )
+        self.predict()
 
     def on_classify_button_clicked(self):
         text = self.input_layer_combo_box.currentText()
         self.input_layer = self.napari_util.getLayerWithName(text)
         self.pixelClassifier.image = self.input_layer.data
+        self.predict()
+
+    def on_save_button_clicked(self):
+        if not self.pixelClassifier or not self.pixelClassifier.classifier:
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Save Classifier", "classifier.joblib", "Classifier (*.joblib)"
+        )
+        if path:
+            self.pixelClassifier.save(path)
+
+    def on_load_button_clicked(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Load Classifier", "", "Classifier (*.joblib)"
+        )
+        if path:
+            from filament_toolbox.lib.ml import PixelClassifier
+
+            self.pixelClassifier = PixelClassifier.load(path)
+
+    def predict(self):
+        self.pixelClassifier.calculate_probabilities = (
+            self.probabilities_check_box.isChecked()
+        )
         self.pixelClassifier.predict()
         name = self.input_layer.name + " labels"
         self.viewer.add_labels(
@@ -1777,3 +2296,17 @@ class PixelClassifierWidget(ToolboxWidget):
             units=self.input_layer.units,
             blending="additive",
         )
+        if self.pixelClassifier.probabilities is None:
+            return
+        names = [
+            self.input_layer.name + " probability " + str(label)
+            for label in self.pixelClassifier.classifier.classes_
+        ]
+        self.viewer.add_image(
+            self.pixelClassifier.probabilities,
+            channel_axis=0,
+            name=names,
+            scale=self.input_layer.scale,
+            units=self.input_layer.units,
+            blending="additive",
+        )
@@ -1,3 +1,5 @@
+import itertools
+
 import numpy as np
 
 
@@ -37,3 +39,67 @@ class ArrayUtil:
         stripped = np.array(list(zip(*stripped)))
         return stripped, columnIndices, rowIndices
 
+
+    @staticmethod
+    def getTiles(shape, tileShape, halo=0):
+        """Split an array of the given shape into tiles with a halo.
+
+        Iterates over the tiles of the array in C-order. Each tile is
+        returned together with the region around it, enlarged by the halo
+        on every side and clipped to the array, so that operations with a
+        finite support can be run on the padded region and cropped back
+        to the tile without border artefacts.
+
+        :param shape: The shape of the array
+        :type shape: tuple
+        :param tileShape: The shape of a tile or one size for all axes
+        :type tileShape: tuple or int
+        :param halo: The size of the halo on each side, one value per axis
+                     or one value for all axes
+        :type halo: tuple or int
+        :return: A generator of 3-tuples with
+
+            * the slices of the padded tile in the array
+            * the slices of the tile in the array
+            * the slices of the tile in the padded tile
+
+        :rtype: generator
+        """
+        ndim = len(shape)
+        tileShape = [int(size) for size in np.broadcast_to(tileShape, ndim)]
+        halo = [int(size) for size in np.broadcast_to(halo, ndim)]
+        starts = [range(0, size, tile) for size, tile in zip(shape, tileShape)]
+        for start in itertools.product(*starts):
+            padded = []
+            inner = []
+            innerInPadded = []
+            for axis, begin in enumerate(start):
+                end = min(begin + tileShape[axis], shape[axis])
+                paddedBegin = max(begin - halo[axis], 0)
+                paddedEnd = min(end + halo[axis], shape[axis])
+                padded.append(slice(paddedBegin, paddedEnd))
+                inner.append(slice(begin, end))
+                innerInPadded.append(slice(begin - paddedBegin, end - paddedBegin))
+            yield tuple(padded), tuple(inner), tuple(innerInPadded)
+
+
+    @staticmethod
+    def getSlabs(shape, voxels):
+        """Split an array of the given shape into slabs along the first axis.
+
+        Each slab has about the given number of voxels, but is at least one
+        plane thick. Reading an array slab by slab keeps the memory bounded
+        for memory-mapped and zarr arrays, which are not loaded at once.
+
+        :param shape: The shape of the array
+        :type shape: tuple
+        :param voxels: The number of voxels of a slab
+        :type voxels: int
+        :return: The slices of the slabs in the array
+        :rtype: list
+        """
+        shape = tuple(shape)
+        planeSize = int(np.prod(shape[1:]))
+        thickness = max(1, int(voxels) // max(planeSize, 1))
+        tiles = ArrayUtil.getTiles(shape, (thickness,) + shape[1:])
+        return [inner for _, inner, _ in tiles]
@@ -0,0 +1,453 @@
+import datetime
+import glob
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from concurrent.futures.process import BrokenProcessPool
+
+from skimage.io import imread
+from skimage.io import imsave
+
+from filament_toolbox.lib.pipeline import Pipeline
+from filament_toolbox.lib.pipeline import read_image
+from filament_toolbox.lib.table import ResultsTable
+
+
+IMAGE_EXTENSIONS = (".tif", ".tiff", ".png", ".jpg", ".jpeg")
+
+
+def is_zarr(path):
+    return os.path.normpath(path).lower().endswith(".zarr")
+
+
+def get_input_paths(inputs, extensions=IMAGE_EXTENSIONS):
+    """Answer the sorted image files given by a list of files, folders and
+    glob patterns. Folders are replaced by the files in them that have one
+    of the extensions, except for zarr folders, which are images."""
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    paths = []
+    for item in inputs:
+        if is_zarr(item) and os.path.isdir(item):
+            paths.append(os.path.normpath(item))
+        elif os.path.isdir(item):
+            paths.extend(
+                os.path.join(item, name)
+                for name in os.listdir(item)
+                if name.lower().endswith(extensions)
+            )
+        elif os.path.isfile(item):
+            paths.append(item)
+        else:
+            paths.extend(glob.glob(item))
+    return sorted(set(paths))
+
+
+def get_image_pairs(inputs1, inputs2):
+    """Answer the pairs of images given by two lists of files, folders or
+    glob patterns. The images are paired by their names without the
+    extension. If both lists contain a single file, the two files are
+    paired."""
+    paths1 = get_input_paths(inputs1)
+    paths2 = get_input_paths(inputs2)
+    if len(paths1) == 1 and len(paths2) == 1:
+        return [(paths1[0], paths2[0])]
+    paths2_by_name = {
+        os.path.splitext(os.path.basename(path))[0]: path for path in paths2
+    }
+    pairs = []
+    for path in paths1:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in paths2_by_name:
+            pairs.append((path, paths2_by_name[name]))
+    return pairs
+
+
+def get_size(path):
+    """Answer the size of a file or the total size of the files in a
+    folder, like the chunks of a zarr array."""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(folder, name))
+        for folder, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def write_table(table, path):
+    """Write a table, given as a dictionary of columns, to a csv file or,
+    if the path ends with .parquet, to a parquet file, which needs
+    pyarrow."""
+    ResultsTable(table).save(path)
+
+
+_worker_classifier = None
+
+
+def _load_classifier(model_path):
+    global _worker_classifier
+    from filament_toolbox.lib.ml import PixelClassifier
+
+    from functools import partial
+
+    from threadpoolctl import threadpool_limits
+
+    # the processes run in parallel, each of them with a single thread
+    threadpool_limits(limits=1)
+    _worker_classifier = PixelClassifier.load(model_path)
+    _worker_classifier.n_workers = 1
+    _worker_classifier.set_n_jobs(1)
+    _worker_classifier.features_func = partial(
+        _worker_classifier.features_func, workers=1
+    )
+
+
+def _classify(input_path, output_path, calculate_probabilities):
+    classifier = _worker_classifier
+    classifier.image = imread(input_path)
+    classifier.calculate_probabilities = calculate_probabilities
+    classifier.predict()
+    imsave(output_path, classifier.result, check_contrast=False)
+    if calculate_probabilities:
+        base, extension = os.path.splitext(output_path)
+        imsave(base + "_probabilities" + extension, classifier.probabilities,
+               check_contrast=False)
+    return output_path
+
+
+class BatchPixelClassification(object):
+    """Apply a saved pixel classifier to many images.
+
+    Each worker process loads the model once and classifies one image at a
+    time, with a single thread. The label images are written to the output
+    folder, with the name of the input image and the suffix. The result
+    holds the written label images and errors the error of each image that
+    could not be classified.
+    """
+
+    def __init__(self, model_path, input_paths, output_folder):
+        super().__init__()
+        self.model_path = model_path
+        self.input_paths = input_paths
+        self.output_folder = output_folder
+        self.suffix = "_labels"
+        self.calculate_probabilities = False
+        self.n_workers = None       # None for one worker per cpu
+        self.result = None
+        self.errors = None
+
+    def get_output_path(self, input_path):
+        name = os.path.splitext(os.path.basename(input_path))[0]
+        return os.path.join(self.output_folder, name + self.suffix + ".tif")
+
+    def run(self):
+        os.makedirs(self.output_folder, exist_ok=True)
+        self.result = []
+        self.errors = {}
+        with ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            initializer=_load_classifier,
+            initargs=(self.model_path,),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _classify, input_path, self.get_output_path(input_path),
+                    self.calculate_probabilities,
+                )
+                for input_path in self.input_paths
+            ]
+            for input_path, future in zip(self.input_paths, futures):
+                try:
+                    self.result.append(future.result())
+                # any error of a single image is recorded, the batch goes on
+                except Exception as error:  # noqa: BLE001
+                    self.errors[input_path] = repr(error)
+
+
+def _evaluate(path1, path2, metrics):
+    from filament_toolbox.lib.metric import MetricsEvaluation
+
+    evaluation = MetricsEvaluation(imread(path1), imread(path2), metrics)
+    evaluation.run()
+    return evaluation.result, evaluation.tables
+
+
+class BatchMetrics(object):
+    """Calculate metrics for many pairs of label images.
+
+    Each pair is evaluated in a worker process, where the skeletons are
+    shared between the metrics. The result is one table with a row per
+    pair, with the values of the metrics and the counts of the F1-score,
+    and, for the metrics with a value per object, like the instance clDice,
+    object_tables holds a table with a row per object of all pairs.
+    """
+
+    def __init__(self, pairs, metrics=("Dice", "clDice")):
+        super().__init__()
+        self.pairs = pairs
+        self.metrics = list(metrics)
+        self.n_workers = None       # None for one worker per cpu
+        self.table = None
+        self.object_tables = None
+
+    def run(self):
+        paths1 = [pair[0] for pair in self.pairs]
+        paths2 = [pair[1] for pair in self.pairs]
+        self.table = {"image1": paths1, "image2": paths2}
+        self.object_tables = {}
+        with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+            results = executor.map(
+                _evaluate, paths1, paths2, [self.metrics] * len(paths1)
+            )
+            for path1, path2, (result, tables) in zip(paths1, paths2, results):
+                for name, value in result.items():
+                    self.table.setdefault(name, []).append(value)
+                for name, table in tables.items():
+                    self.add_object_rows(name, path1, path2, table)
+
+    def add_object_rows(self, name, path1, path2, table):
+        n_rows = len(next(iter(table.values()), []))
+        object_table = self.object_tables.setdefault(
+            name, {"image1": [], "image2": []}
+        )
+        object_table["image1"].extend([path1] * n_rows)
+        object_table["image2"].extend([path2] * n_rows)
+        for column, values in table.items():
+            object_table.setdefault(column, []).extend(values)
+
+    def get_object_table_path(self, path, name):
+        base, extension = os.path.splitext(path)
+        return base + "_" + name.replace(" ", "_") + extension
+
+    def save(self, path):
+        """Write the table to path and each table of objects next to it,
+        with the name of its metric added to the name of the file."""
+        write_table(self.table, path)
+        for name, table in self.object_tables.items():
+            write_table(table, self.get_object_table_path(path, name))
+
+
+
+def _run_pipeline(description, input_path, output_folder, name, scale,
+                  image_format, table_format):
+    start = time.perf_counter()
+    pipeline = Pipeline.from_dict(description)
+    pipeline.scale = scale
+    pipeline.image = read_image(input_path)
+    pipeline.run()
+    paths = pipeline.save_results(
+        output_folder, name, image_format=image_format,
+        table_format=table_format,
+    )
+    return paths, time.perf_counter() - start
+
+
+class BatchPipeline(object):
+    """Apply a pipeline to many images, one image per worker process.
+
+    Images whose files, or zarr folders, are bigger than large_image_bytes
+    are large jobs, of which at most max_large_jobs run at the same time,
+    so that the memory used by the workers stays bounded while small images
+    keep all workers busy. If a worker dies, for example because it ran out
+    of memory, the pool is replaced and the images that were running are
+    run again one at a time, so that only the image that kills its worker
+    fails. The outputs of each image are written to the output folder, with
+    the name of the image and the names of the outputs, and each finished
+    or failed image is recorded in the manifest file of the run. Images
+    with the same name in different folders are refused, since their
+    outputs would overwrite each other. With resume, images whose outputs
+    are recorded in the manifest of a previous run of the same pipeline,
+    with the same scale and formats, and still exist are skipped, so that
+    a run that crashed can be continued.
+    """
+
+    manifest_name = "manifest.json"
+
+    def __init__(self, pipeline, input_paths, output_folder):
+        super().__init__()
+        self.pipeline = pipeline
+        self.input_paths = input_paths
+        self.output_folder = output_folder
+        self.scale = None
+        self.image_format = "tif"       # tif or zarr
+        self.table_format = "csv"       # csv or parquet
+        self.n_workers = None           # None for one worker per cpu
+        self.large_image_bytes = 2**30
+        self.max_large_jobs = 1
+        self.resume = True
+        self.manifest = None
+        self.result = None
+
+    def get_manifest_path(self):
+        return os.path.join(self.output_folder, self.manifest_name)
+
+    def get_name(self, input_path):
+        return os.path.splitext(os.path.basename(input_path))[0]
+
+    def check_names(self):
+        paths_by_name = {}
+        for input_path in self.input_paths:
+            name = self.get_name(input_path)
+            if name in paths_by_name:
+                raise ValueError(
+                    f"The images {paths_by_name[name]} and {input_path} have "
+                    f"the same name {name}, their outputs would overwrite "
+                    "each other."
+                )
+            paths_by_name[name] = input_path
+
+    def get_parameters(self):
+        """Answer the parameters of the run on which the outputs depend."""
+        return {
+            "scale": None if self.scale is None else list(self.scale),
+            "image_format": self.image_format,
+            "table_format": self.table_format,
+        }
+
+    def load_manifest(self):
+        """Answer the manifest of the previous run, if it applied the same
+        pipeline with the same parameters, or a new manifest."""
+        description = self.pipeline.to_dict()
+        parameters = self.get_parameters()
+        path = self.get_manifest_path()
+        if self.resume and os.path.exists(path):
+            with open(path) as file:
+                manifest = json.load(file)
+            if (manifest.get("pipeline") == description
+                    and manifest.get("parameters") == parameters):
+                return manifest
+        return {"pipeline": description, "parameters": parameters,
+                "runs": [], "images": {}}
+
+    def save_manifest(self):
+        """Write the manifest to a temporary file that replaces the old
+        manifest, so that a crash never leaves a truncated manifest."""
+        path = self.get_manifest_path()
+        with open(path + ".tmp", "w") as file:
+            json.dump(self.manifest, file, indent=4)
+        os.replace(path + ".tmp", path)
+
+    def is_done(self, input_path):
+        entry = self.manifest["images"].get(os.path.abspath(input_path))
+        return (
+            entry is not None
+            and entry["status"] == "done"
+            and all(os.path.exists(path) for path in entry["outputs"])
+        )
+
+    def is_large(self, input_path):
+        return get_size(input_path) > self.large_image_bytes
+
+    def run(self):
+        self.check_names()
+        os.makedirs(self.output_folder, exist_ok=True)
+        self.manifest = self.load_manifest()
+        run = {"started": datetime.datetime.now().isoformat()}
+        self.manifest["runs"].append(run)
+        pending = deque(
+            path for path in self.input_paths if not self.is_done(path)
+        )
+        run["skipped"] = len(self.input_paths) - len(pending)
+        self.save_manifest()
+        n_workers = self.n_workers or os.cpu_count()
+        self.result = []
+        suspects = deque()
+        running = {}
+        executor = ProcessPoolExecutor(max_workers=n_workers)
+        try:
+            while pending or suspects or running:
+                if not self.start_jobs(executor, pending, suspects, running,
+                                       n_workers):
+                    executor.shutdown()
+                    executor = ProcessPoolExecutor(max_workers=n_workers)
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                if any(isinstance(future.exception(), BrokenProcessPool)
+                       for future in done):
+                    self.recover(running, suspects)
+                    executor.shutdown()
+                    executor = ProcessPoolExecutor(max_workers=n_workers)
+                else:
+                    for future in done:
+                        self.record(running.pop(future), future)
+                self.save_manifest()
+        finally:
+            executor.shutdown()
+        run["finished"] = datetime.datetime.now().isoformat()
+        self.save_manifest()
+
+    def start_jobs(self, executor, pending, suspects, running, n_workers):
+        """Submit the jobs that may start now. A suspect runs alone, so
+        that it is known whether it kills its worker. Answer False if the
+        pool is broken."""
+        description = self.pipeline.to_dict()
+        while len(running) < n_workers:
+            if suspects:
+                if running:
+                    break
+                queue, input_path = suspects, suspects.popleft()
+            else:
+                queue = pending
+                input_path = self.next_job(pending, running.values())
+                if input_path is None:
+                    break
+            try:
+                future = executor.submit(
+                    _run_pipeline, description, input_path,
+                    self.output_folder, self.get_name(input_path),
+                    self.scale, self.image_format, self.table_format,
+                )
+            except BrokenProcessPool:
+                queue.appendleft(input_path)
+                return bool(running)
+            running[future] = input_path
+            if queue is suspects:
+                break
+        return True
+
+    def recover(self, running, suspects):
+        """Handle the jobs of a pool that is broken, because a worker died,
+        for example when it ran out of memory. The jobs that finished are
+        recorded. If a single job was running, it killed its worker and is
+        recorded as failed, otherwise the jobs that were running become
+        suspects, which are run again one at a time."""
+        unfinished = [
+            future for future in running
+            if not future.done()
+            or isinstance(future.exception(), BrokenProcessPool)
+        ]
+        for future in list(running):
+            if future not in unfinished:
+                self.record(running.pop(future), future)
+        if len(unfinished) == 1:
+            self.record(running.pop(unfinished[0]), unfinished[0])
+            return
+        for future in unfinished:
+            suspects.append(running.pop(future))
+
+    def next_job(self, pending, running_paths):
+        """Remove and answer the first pending image that may start now, or
+        answer None if only large images are pending and max_large_jobs
+        large images are running."""
+        large_jobs = sum(1 for path in running_paths if self.is_large(path))
+        for input_path in pending:
+            if (not self.is_large(input_path)
+                    or large_jobs < max(self.max_large_jobs, 1)):
+                pending.remove(input_path)
+                return input_path
+        return None
+
+    def record(self, input_path, future):
+        try:
+            outputs, seconds = future.result()
+            entry = {"status": "done", "outputs": outputs, "seconds": seconds}
+            self.result.append(input_path)
+        # any error of a single image is recorded, the batch goes on
+        except Exception as error:  # noqa: BLE001
+            entry = {"status": "failed", "error": repr(error)}
+        self.manifest["images"][os.path.abspath(input_path)] = entry
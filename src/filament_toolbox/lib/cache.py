@@ -0,0 +1,283 @@
+import hashlib
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+from skimage.morphology import skeletonize
+
+from filament_toolbox.lib.array_util import ArrayUtil
+from filament_toolbox.lib.operation import run_steps
+
+
+def array_hash(array, chunk_bytes=2**26):
+    """Answer a hash of the shape, the type and the content of the array,
+    which is read in slabs of chunk_bytes bytes."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str((tuple(array.shape), str(array.dtype))).encode())
+    if array.ndim == 0 or array.size == 0:
+        digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+    for chunk in ArrayUtil.getSlabs(array.shape, chunk_bytes // array.itemsize):
+        digest.update(np.ascontiguousarray(array[chunk]).data)
+    return digest.hexdigest()
+
+
+class ArrayCache(object):
+    """A thread-safe cache of arrays, that removes the least recently used
+    arrays when the total size of the cached arrays exceeds max_bytes or
+    their number exceeds max_entries.
+
+    The cached arrays are made read-only, since they are shared by all
+    users of the cache, so that a caller that wants to modify an array it
+    has put into the cache must modify a copy.
+    """
+
+    def __init__(self, max_bytes=2**30, max_entries=None):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.n_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, array):
+        """Add the array under the key and make it read-only, unless it is
+        bigger than max_bytes, in which case it is not cached."""
+        if array.nbytes > self.max_bytes:
+            return
+        array.flags.writeable = False
+        with self.lock:
+            if key in self.entries:
+                self.n_bytes -= self.entries.pop(key).nbytes
+            self.entries[key] = array
+            self.n_bytes += array.nbytes
+            self.evict()
+
+    def set_max_bytes(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.evict()
+
+    def evict(self):
+        while self.n_bytes > self.max_bytes or (
+            self.max_entries is not None
+            and len(self.entries) > self.max_entries
+        ):
+            _, removed = self.entries.popitem(last=False)
+            self.n_bytes -= removed.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.n_bytes = 0
+
+
+class SkeletonCache(ArrayCache):
+    """Cache skeletons by the content of the skeletonized image, so that
+    skeletonizing the same image again, for example a ground truth that is
+    compared to many predictions, costs only the hashing of the image."""
+
+    def __init__(self, max_bytes=2**30, max_entries=32):
+        super().__init__(max_bytes=max_bytes, max_entries=max_entries)
+
+    def skeletonize(self, image, method=None):
+        key = (array_hash(image), method)
+        skeleton = self.get(key)
+        if skeleton is None:
+            skeleton = skeletonize(image, method=method)
+            self.put(key, skeleton)
+        return skeleton
+
+
+class ResultCache(ArrayCache):
+    """Cache the results of operations by the class of the operation, the
+    content of its input arrays and the values of its other attributes, so
+    that running an operation again with the same inputs and parameters
+    returns the result at once.
+
+    The results are kept in memory, with the least recently used results
+    removed when max_bytes is exceeded, and, if folder is set, the results
+    that took at least min_disk_seconds to calculate are also written to
+    .npy files in the folder. The least recently used files are removed
+    when they take more than max_disk_bytes. Results found on disk are
+    memory-mapped. The hashes of the results held by the cache, which are
+    read-only and often the inputs of the next operation, are only
+    calculated once.
+
+    Other inputs are hashed on every run, which reads them once more.
+    Operations with such inputs bigger than max_hash_bytes, or with inputs
+    that are array-likes other than numpy arrays, like dask or zarr arrays,
+    are therefore run without the cache. The cached results are the results
+    of the operations, which are made read-only, not copies of them.
+    """
+
+    def __init__(self, max_bytes=2**31, folder=None, max_disk_bytes=2**33,
+                 min_disk_seconds=1.0, max_hash_bytes=2**28):
+        super().__init__(max_bytes=max_bytes)
+        self.folder = folder
+        self.max_disk_bytes = max_disk_bytes
+        self.min_disk_seconds = min_disk_seconds
+        self.max_hash_bytes = max_hash_bytes
+        self.hashes = {}
+        self.owned = set()
+
+    def own(self, array):
+        """Remember that the array is held by the cache, so that its hash,
+        which cannot change while it is read-only, is only calculated once."""
+        key = id(array)
+        with self.lock:
+            if key in self.owned:
+                return
+            self.owned.add(key)
+        weakref.finalize(array, self.disown, key)
+
+    def disown(self, key):
+        with self.lock:
+            self.owned.discard(key)
+            self.hashes.pop(key, None)
+
+    def get_hash(self, array):
+        key = id(array)
+        with self.lock:
+            if key not in self.owned:
+                key = None
+            elif key in self.hashes:
+                return self.hashes[key]
+        digest = array_hash(array)
+        if key is not None:
+            with self.lock:
+                if key in self.owned:
+                    self.hashes[key] = digest
+        return digest
+
+    def get_value_key(self, value):
+        """Answer the string by which the value of an attribute enters the
+        key, or None if the value is an array-like that is not a numpy
+        array or an array that is too big to be hashed on every run."""
+        if isinstance(value, np.ndarray):
+            with self.lock:
+                owned = id(value) in self.owned
+            if not owned and value.nbytes > self.max_hash_bytes:
+                return None
+            return self.get_hash(value)
+        if isinstance(value, (list, tuple)):
+            keys = [self.get_value_key(item) for item in value]
+            if any(key is None for key in keys):
+                return None
+            return f"{type(value).__name__}({', '.join(keys)})"
+        if not isinstance(value, np.generic) and (
+            hasattr(value, "__array__")
+            or (hasattr(value, "shape") and hasattr(value, "dtype"))
+        ):
+            return None
+        return repr(value)
+
+    def get_key(self, operation):
+        """Answer the key of the result of the operation, calculated from
+        its class and its attributes, except for the result, or None if
+        the result of the operation can not be cached."""
+        digest = hashlib.blake2b(digest_size=16)
+        cls = type(operation)
+        digest.update(f"{cls.__module__}.{cls.__qualname__}".encode())
+        for name, value in sorted(vars(operation).items()):
+            if name == "result" or name.startswith("_"):
+                continue
+            value = self.get_value_key(value)
+            if value is None:
+                return None
+            digest.update(f"{name}={value};".encode())
+        return digest.hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.folder, key + ".npy")
+
+    def get(self, key):
+        result = super().get(key)
+        if result is not None or self.folder is None:
+            return result
+        path = self.get_path(key)
+        try:
+            result = np.load(path, mmap_mode="r")
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        self.own(result)
+        return result
+
+    def put(self, key, array, seconds=None):
+        super().put(key, array)
+        if array.nbytes <= self.max_bytes:
+            self.own(array)
+        if self.folder is None or (
+            seconds is not None and seconds < self.min_disk_seconds
+        ):
+            return
+        if array.nbytes > self.max_disk_bytes or array.dtype.hasobject:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        path = self.get_path(key)
+        with open(path + ".tmp", "wb") as file:
+            np.save(file, array)
+        os.replace(path + ".tmp", path)
+        self.evict_files()
+
+    def evict_files(self):
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith(".npy"):
+                try:
+                    stat = os.stat(os.path.join(self.folder, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        super().clear()
+        if self.folder is not None and os.path.isdir(self.folder):
+            for name in os.listdir(self.folder):
+                if name.endswith(".npy"):
+                    os.remove(os.path.join(self.folder, name))
+
+    def run_steps(self, operation):
+        """Set the cached result of the operation, or run the operation
+        step by step and cache its result, which is made read-only. A run
+        that is not completed leaves the cache unchanged."""
+        key = self.get_key(operation)
+        if key is None:
+            yield from run_steps(operation)
+            return
+        result = self.get(key)
+        if result is not None:
+            operation.result = result
+            yield
+            return
+        start = time.perf_counter()
+        yield from run_steps(operation)
+        if isinstance(operation.result, np.ndarray):
+            self.put(key, operation.result, time.perf_counter() - start)
+
+
+SKELETON_CACHE = SkeletonCache()
+# the results are only written to disk if the environment variable
+# FILAMENT_TOOLBOX_CACHE_FOLDER names a folder for them
+RESULT_CACHE = ResultCache(folder=os.environ.get("FILAMENT_TOOLBOX_CACHE_FOLDER"))
@@ -3,10 +3,7 @@ from abc import abstractmethod
 
 import numpy as np
 from scipy.ndimage import median_filter
-from scipy.ndimage import gaussian_filter
-from skimage.restoration import rolling_ball
-from skimage.filters.ridges import frangi, sato, meijering
-from medpy.filter.smoothing import anisotropic_diffusion
+from scipy.ndimage import gaussian_filter1d
 
 
 
@@ -65,16 +62,32 @@ class AnisotropicDiffusionFilter(Filter):
 
 
     def run(self):
+        for _ in self.run_steps():
+            pass
+
+
+    def get_number_of_steps(self):
+        return self.niter
+
+
+    def run_steps(self):
+        """Diffuse one iteration per step. The diffusion of each iteration
+        only depends on the result of the previous one."""
+        from medpy.filter.smoothing import anisotropic_diffusion
+
         normalizedImage = self.image
         if not self.image.dtype.kind == 'f':
             copiedImage = self.image.astype(np.float64, copy=True)
             normalizedImage = copiedImage / np.iinfo(self.image.dtype).max
-        self.result = anisotropic_diffusion(normalizedImage,
-                              niter=self.niter,
+        self.result = normalizedImage
+        for _ in range(self.niter):
+            self.result = anisotropic_diffusion(self.result,
+                              niter=1,
                               kappa=self.kappa,
                               gamma=self.gamma,
                               voxelspacing=self.get_step(),
                               option=self.option)
+            yield
 
 
 
@@ -93,7 +106,27 @@ class GaussianFilter(Filter):
 
 
     def run(self):
-        self.result = gaussian_filter(self.image, self.get_sigma(), mode=self.mode)
+        for _ in self.run_steps():
+            pass
+
+
+    def get_number_of_steps(self):
+        return self.image.ndim
+
+
+    def run_steps(self):
+        """Filter one axis per step, with the same separable 1D filters, in
+        the same order and with the same output type as gaussian_filter."""
+        self.result = np.zeros(self.image.shape, dtype=self.image.dtype)
+        source = self.image
+        for axis, sigma in enumerate(self.get_sigma()):
+            if sigma > 1e-15:
+                gaussian_filter1d(source, sigma, axis=axis, output=self.result,
+                                  mode=self.mode)
+                source = self.result
+            yield
+        if source is self.image:
+            self.result[...] = self.image
 
 
 
@@ -122,6 +155,8 @@ class RollingBall(Filter):
 
 
     def run(self):
+        from skimage.restoration import rolling_ball
+
         self.result = self.image - rolling_ball(self.image,
                                                 radius=self.radius)
 
@@ -135,9 +170,31 @@ class RidgeFilter(Filter):
         self.black_ridges = False
 
 
-    @abstractmethod
     def run(self):
-        raise Exception("Abstract method run of class RidgeFilter called!")
+        for _ in self.run_steps():
+            pass
+
+
+    def get_number_of_steps(self):
+        return len(self.sigmas)
+
+
+    def run_steps(self):
+        """Filter with one sigma per step and keep the maximum of the
+        responses, as the ridge filters of skimage do."""
+        self.result = None
+        for sigma in self.sigmas:
+            response = self.filter([sigma])
+            if self.result is None:
+                self.result = response
+            else:
+                np.maximum(self.result, response, out=self.result)
+            yield
+
+
+    @abstractmethod
+    def filter(self, sigmas):
+        raise Exception("Abstract method filter of class RidgeFilter called!")
 
 
 
@@ -151,14 +208,32 @@ class FrangiFilter(RidgeFilter):
         self.gamma = None
 
 
-    def run(self):
-        self.result = frangi(self.image,
-                             sigmas=self.sigmas,
-                             alpha=self.alpha,
-                             beta=self.beta,
-                             gamma=self.gamma,
-                             black_ridges=self.black_ridges,
-                             mode=self.mode)
+    def get_number_of_steps(self):
+        if self.gamma is None:
+            return 1
+        return len(self.sigmas)
+
+
+    def run_steps(self):
+        """Without gamma, frangi derives gamma from the response to the first
+        sigma and uses it for all sigmas, so the filter runs in one step."""
+        if self.gamma is not None:
+            yield from super().run_steps()
+            return
+        self.result = self.filter(self.sigmas)
+        yield
+
+
+    def filter(self, sigmas):
+        from skimage.filters import frangi
+
+        return frangi(self.image,
+                      sigmas=sigmas,
+                      alpha=self.alpha,
+                      beta=self.beta,
+                      gamma=self.gamma,
+                      black_ridges=self.black_ridges,
+                      mode=self.mode)
 
 
 
@@ -170,12 +245,14 @@ class MeijeringFilter(RidgeFilter):
         self.alpha = None
 
 
-    def run(self):
-        self.result = meijering(self.image,
-                           sigmas=self.sigmas,
-                           alpha=self.alpha,
-                           black_ridges=self.black_ridges,
-                           mode=self.mode)
+    def filter(self, sigmas):
+        from skimage.filters import meijering
+
+        return meijering(self.image,
+                         sigmas=sigmas,
+                         alpha=self.alpha,
+                         black_ridges=self.black_ridges,
+                         mode=self.mode)
 
 
 
@@ -186,9 +263,11 @@ class SatoFilter(RidgeFilter):
         super().__init__(input_image)
 
 
-    def run(self):
-        self.result = sato(self.image,
-                             sigmas=self.sigmas,
-                             black_ridges=self.black_ridges,
-                             mode=self.mode)
+    def filter(self, sigmas):
+        from skimage.filters import sato
+
+        return sato(self.image,
+                    sigmas=sigmas,
+                    black_ridges=self.black_ridges,
+                    mode=self.mode)
 
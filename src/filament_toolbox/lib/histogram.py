@@ -0,0 +1,152 @@
+import numpy as np
+from skimage.filters import threshold_otsu
+
+from filament_toolbox.lib.array_util import ArrayUtil
+
+
+THRESHOLD_METHODS = ("otsu", "li", "triangle")
+
+
+class ImageStatistics(object):
+    """Calculate the minimum, the maximum, the mean, the standard deviation
+    and the histogram of an image in two passes over slabs of the image.
+
+    Integer images with at most max_integer_bins different values get one
+    bin per value, other images get n_bins bins of equal width. Percentiles
+    and automatic thresholds are calculated from the histogram, without
+    reading the image again.
+    """
+
+    def __init__(self, image):
+        super().__init__()
+        self.image = image
+        self.n_bins = 1024
+        self.max_integer_bins = 2**16
+        self.chunk_voxels = 2**24
+        self.min = None
+        self.max = None
+        self.mean = None
+        self.std = None
+        self.histogram = None
+        self.bin_edges = None
+
+    def run(self):
+        chunks = ArrayUtil.getSlabs(self.image.shape, self.chunk_voxels)
+        minima, maxima = [], []
+        total, square_total, count = 0.0, 0.0, 0
+        for chunk in chunks:
+            block = np.asarray(self.image[chunk])
+            minima.append(np.nanmin(block))
+            maxima.append(np.nanmax(block))
+            values = block.astype(np.float64)
+            total += float(np.nansum(values))
+            square_total += float(np.nansum(values * values))
+            count += int(np.count_nonzero(~np.isnan(values)))
+        self.min = min(minima)
+        self.max = max(maxima)
+        self.mean = total / count
+        self.std = float(np.sqrt(max(square_total / count - self.mean**2, 0)))
+        if self.has_integer_bins():
+            self.bin_edges = np.arange(int(self.min), int(self.max) + 2) - 0.5
+            offset = int(self.min)
+            self.histogram = np.zeros(len(self.bin_edges) - 1, np.int64)
+            for chunk in chunks:
+                block = np.asarray(self.image[chunk]).ravel()
+                self.histogram += np.bincount(
+                    block.astype(np.int64) - offset,
+                    minlength=len(self.histogram),
+                )
+            return
+        self.histogram = np.zeros(self.n_bins, np.int64)
+        value_range = (float(self.min), float(self.max))
+        if value_range[0] == value_range[1]:
+            value_range = (value_range[0] - 0.5, value_range[1] + 0.5)
+        for chunk in chunks:
+            counts, self.bin_edges = np.histogram(
+                np.asarray(self.image[chunk]), bins=self.n_bins,
+                range=value_range,
+            )
+            self.histogram += counts
+
+    def has_integer_bins(self):
+        return (
+            np.issubdtype(self.image.dtype, np.integer)
+            and int(self.max) - int(self.min) < self.max_integer_bins
+        )
+
+    def get_bin_centers(self):
+        return (self.bin_edges[:-1] + self.bin_edges[1:]) / 2
+
+    def get_percentile(self, percentile):
+        """Answer the center of the bin in which the given percentile of the
+        values lies."""
+        cumulative = np.cumsum(self.histogram)
+        position = percentile / 100.0 * cumulative[-1]
+        index = int(np.searchsorted(cumulative, position, side="left"))
+        return self.get_bin_centers()[min(index, len(cumulative) - 1)]
+
+    def get_threshold(self, method="otsu"):
+        """Answer the threshold of the given method, one of THRESHOLD_METHODS,
+        calculated from the histogram. Values above the threshold are the
+        foreground."""
+        if method not in THRESHOLD_METHODS:
+            raise ValueError(
+                f"Unknown threshold method {method}, "
+                f"known methods are {', '.join(THRESHOLD_METHODS)}."
+            )
+        if self.min == self.max:
+            return self.min
+        return getattr(self, "get_" + method + "_threshold")()
+
+    def get_otsu_threshold(self):
+        return threshold_otsu(hist=(self.histogram, self.get_bin_centers()))
+
+    def get_li_threshold(self):
+        """Li's minimum cross entropy threshold, iterated on the histogram
+        like skimage.filters.threshold_li does for integer images."""
+        centers = self.get_bin_centers()
+        offset = centers[0]
+        centers = centers - offset
+        weights = self.histogram.astype(np.float64)
+        tolerance = np.min(np.diff(centers)) / 2
+        t_next = np.average(centers, weights=weights)
+        t_current = -2 * tolerance
+        while abs(t_next - t_current) > tolerance:
+            t_current = t_next
+            foreground = centers > t_current
+            background = ~foreground
+            mean_fore = np.average(centers[foreground],
+                                   weights=weights[foreground])
+            mean_back = np.average(centers[background],
+                                   weights=weights[background])
+            if mean_back == 0:
+                break
+            t_next = (mean_back - mean_fore) / (
+                np.log(mean_back) - np.log(mean_fore)
+            )
+        return t_next + offset
+
+    def get_triangle_threshold(self):
+        """The triangle threshold, calculated from the histogram like
+        skimage.filters.threshold_triangle does."""
+        histogram = self.histogram.astype(np.float64)
+        n_bins = len(histogram)
+        arg_peak_height = int(np.argmax(histogram))
+        peak_height = histogram[arg_peak_height]
+        arg_low_level, arg_high_level = np.flatnonzero(histogram)[[0, -1]]
+        if arg_low_level == arg_high_level:
+            return self.get_bin_centers()[arg_low_level]
+        flip = arg_peak_height - arg_low_level < arg_high_level - arg_peak_height
+        if flip:
+            histogram = histogram[::-1]
+            arg_low_level = n_bins - arg_high_level - 1
+            arg_peak_height = n_bins - arg_peak_height - 1
+        width = arg_peak_height - arg_low_level
+        x1 = np.arange(width)
+        y1 = histogram[x1 + arg_low_level]
+        norm = np.sqrt(peak_height**2 + width**2)
+        length = (peak_height / norm) * x1 - (width / norm) * y1
+        arg_level = int(np.argmax(length)) + arg_low_level
+        if flip:
+            arg_level = n_bins - arg_level - 1
+        return self.get_bin_centers()[arg_level]
@@ -1,9 +1,78 @@
-from skan import Skeleton
-from skan import summarize
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import ndimage
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 from skimage.measure import regionprops_table
 
+from filament_toolbox.lib.array_util import ArrayUtil
+from filament_toolbox.lib.table import ResultsTable
+
+
+def _imapBounded(function, tasks, nWorkers):
+    """Answer the results of the function applied to the argument tuples
+    of the tasks, in order. The tasks are run in a pool of worker processes,
+    with only a few tasks per worker submitted at a time, so that the
+    arguments of all tasks are not held in memory at once."""
+    with ProcessPoolExecutor(max_workers=nWorkers) as executor:
+        maxPending = 2 * (nWorkers or os.cpu_count() or 1)
+        futures = deque()
+        for arguments in tasks:
+            futures.append(executor.submit(function, *arguments))
+            if len(futures) >= maxPending:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def _measureSkeletonComponents(components, spacing, findMainBranch):
+    """Summarize the branches of a batch of connected skeleton components,
+    each given by the coordinates and the values of its pixels. Each
+    component is analyzed on an image of the size of its bounding box and
+    the coordinates in the table and of the paths are translated back into
+    the coordinates of the full image."""
+    from skan import Skeleton
+    from skan import summarize
+
+    results = []
+    for coordinates, values in components:
+        offset = coordinates.min(axis=0)
+        local = coordinates - offset
+        image = np.zeros(tuple(local.max(axis=0) + 1), values.dtype)
+        image[tuple(local.T)] = values
+        skeleton = Skeleton(image, spacing=spacing)
+        branchData = summarize(
+            skeleton, separator="_", find_main_branch=findMainBranch
+        )
+        table = {key: value.values for key, value in branchData.items()}
+        for axis in range(coordinates.shape[1]):
+            for end in ("src", "dst"):
+                key = "image_coord_" + end + "_" + str(axis)
+                table[key] = table[key] + offset[axis]
+                key = "coord_" + end + "_" + str(axis)
+                table[key] = table[key] + offset[axis] * spacing[axis]
+        paths = [
+            skeleton.path_coordinates(index) + offset
+            for index in range(skeleton.n_paths)
+        ]
+        results.append((table, len(skeleton.coordinates), paths))
+    return results
+
 
 class MeasureSkeleton(object):
+    """Measure the branches of a skeleton with skan.
+
+    The connected components of the skeleton are found from the coordinates
+    of its pixels and are analyzed independently, in batches that are
+    distributed over a pool of worker processes, so that the memory needed
+    grows with the size of the skeleton and not with the size of the image.
+    Finding the main branches is optional. The path label image is only
+    created when the result is asked for.
+    """
 
     def __init__(self, mask):
         super().__init__()
@@ -12,17 +81,302 @@ class MeasureSkeleton(object):
         self.result = None
         self.scale = [1] * mask.ndim
         self.units = ["pixel"] * mask.ndim
+        self.findMainBranch = True
+        self.batchSize = 64
+        self.nWorkers = None        # None for one worker per cpu
+        self.paths = None
+
+    @property
+    def result(self):
+        if self._result is None and self.paths is not None:
+            self._result = self.getPathLabelImage()
+        return self._result
+
+    @result.setter
+    def result(self, value):
+        self._result = value
 
     def run(self):
-        skeleton = Skeleton(self.image, spacing=self.scale)
-        branch_data = summarize(skeleton, separator="_", find_main_branch=True)
-        self.table = {}
-        for key, value in branch_data.items():
-            self.table[key] = value.values
-        self.result = skeleton.path_label_image()
+        self.result = None
+        spacing = [float(value) for value in self.scale]
+        components = self.getComponents()
+        batches = [
+            (components[start:start + self.batchSize], spacing,
+             self.findMainBranch)
+            for start in range(0, len(components), self.batchSize)
+        ]
+        if len(batches) < 2 or self.nWorkers == 1:
+            results = (_measureSkeletonComponents(*batch) for batch in batches)
+        else:
+            results = _imapBounded(
+                _measureSkeletonComponents, batches, self.nWorkers
+            )
+        columns = {}
+        self.paths = []
+        skeletonId = 0
+        nodeOffset = 0
+        for batchResults in results:
+            for table, nNodes, paths in batchResults:
+                table["skeleton_id"] = np.full(
+                    len(table["skeleton_id"]), skeletonId
+                )
+                table["node_id_src"] = table["node_id_src"] + nodeOffset
+                table["node_id_dst"] = table["node_id_dst"] + nodeOffset
+                for key, values in table.items():
+                    columns.setdefault(key, []).append(values)
+                self.paths.extend(paths)
+                skeletonId = skeletonId + 1
+                nodeOffset = nodeOffset + nNodes
+        self.table = ResultsTable(
+            {key: np.concatenate(values) for key, values in columns.items()}
+        )
+
+    def getComponents(self):
+        """Answer the coordinates and values of the pixels of each connected
+        component of the skeleton, with full connectivity. Components of a
+        single pixel have no branches and are left out."""
+        image = np.asarray(self.image)
+        coordinates = np.nonzero(image)
+        values = image[coordinates]
+        coordinates = np.stack(coordinates, axis=1)
+        nPixels = len(coordinates)
+        if nPixels == 0:
+            return []
+        shape = np.array(image.shape)
+        indices = np.ravel_multi_index(coordinates.T, image.shape)
+        rows, columns = [], []
+        for offset in self.getNeighborOffsets(image.ndim):
+            neighbors = coordinates + offset
+            inside = np.all((neighbors >= 0) & (neighbors < shape), axis=1)
+            neighborIndices = np.ravel_multi_index(
+                neighbors[inside].T, image.shape
+            )
+            positions = np.searchsorted(indices, neighborIndices)
+            positions = np.minimum(positions, nPixels - 1)
+            found = indices[positions] == neighborIndices
+            rows.append(np.flatnonzero(inside)[found])
+            columns.append(positions[found])
+        rows = np.concatenate(rows)
+        columns = np.concatenate(columns)
+        graph = coo_matrix(
+            (np.ones(len(rows), bool), (rows, columns)), shape=(nPixels, nPixels)
+        )
+        nComponents, componentLabels = connected_components(
+            graph, directed=False
+        )
+        order = np.argsort(componentLabels, kind="stable")
+        splits = np.cumsum(np.bincount(componentLabels, minlength=nComponents))
+        return [
+            (coordinates[pixels], values[pixels])
+            for pixels in np.split(order, splits[:-1])
+            if len(pixels) > 1
+        ]
+
+    @staticmethod
+    def getNeighborOffsets(ndim):
+        """Answer the offsets to the neighbors that come after a pixel in
+        raster order, which is enough to find each pair of neighbors once."""
+        offsets = np.array(list(itertools.product((-1, 0, 1), repeat=ndim)))
+        return offsets[len(offsets) // 2 + 1:]
+
+    def getPathLabelImage(self):
+        """Answer an image in which the pixels of each path of the skeleton
+        are labeled with the number of the path, starting at one."""
+        labels = np.zeros(
+            self.image.shape, np.min_scalar_type(max(len(self.paths), 1))
+        )
+        for index, path in enumerate(self.paths):
+            labels[tuple(path.T)] = index + 1
+        return labels
+
+
+class LabelStatistics(object):
+    """Count the voxels and find the bounding boxes and the sums of the
+    coordinates of all labels in one pass over the label image. If an
+    intensity image is given, the sums, the sums of squares, the minima and
+    the maxima of the intensities of the labels are calculated in the same
+    pass.
+
+    The label image is read in slabs along the first axis. The statistics
+    of each slab are reduced with np.bincount and ndimage.minimum/maximum
+    over the foreground voxels of the slab and the partial results are
+    merged at the end.
+    """
+
+    def __init__(self, labels, intensityImage=None):
+        super().__init__()
+        self.labels = labels
+        self.intensityImage = intensityImage
+        self.chunkVoxels = 2**22
+        self.ids = None
+        self.counts = None
+        self.coordinateSums = None
+        self.bboxMin = None
+        self.bboxMax = None
+        self.intensitySums = None
+        self.intensitySquareSums = None
+        self.intensityMin = None
+        self.intensityMax = None
+
+    def run(self):
+        partialResults = [
+            self.calculateChunk(chunk)
+            for chunk in ArrayUtil.getSlabs(self.labels.shape, self.chunkVoxels)
+        ]
+        self.merge(partialResults)
+
+    def calculateChunk(self, chunk):
+        block = np.asarray(self.labels[chunk])
+        coordinates = np.nonzero(block)
+        ids, inverse = np.unique(block[coordinates], return_inverse=True)
+        index = np.arange(len(ids))
+        sums, minima, maxima = [], [], []
+        for axis, axisCoordinates in enumerate(coordinates):
+            axisCoordinates = axisCoordinates + chunk[axis].start
+            sums.append(np.bincount(inverse, weights=axisCoordinates,
+                                    minlength=len(ids)))
+            if len(ids) == 0:
+                minima.append(index)
+                maxima.append(index)
+                continue
+            minima.append(ndimage.minimum(axisCoordinates, inverse, index))
+            maxima.append(ndimage.maximum(axisCoordinates, inverse, index))
+        result = {
+            "ids": ids,
+            "counts": np.bincount(inverse, minlength=len(ids)),
+            "sums": np.array(sums).reshape(block.ndim, len(ids)),
+            "minima": np.array(minima).reshape(block.ndim, len(ids)),
+            "maxima": np.array(maxima).reshape(block.ndim, len(ids)),
+        }
+        if self.intensityImage is not None:
+            result.update(self.calculateIntensityChunk(
+                chunk, coordinates, inverse, index
+            ))
+        return result
+
+    def calculateIntensityChunk(self, chunk, coordinates, inverse, index):
+        values = np.asarray(self.intensityImage[chunk])[coordinates]
+        values = values.astype(np.float64)
+        n = len(index)
+        if n == 0:
+            return {
+                "intensitySums": np.zeros(0),
+                "intensitySquareSums": np.zeros(0),
+                "intensityMin": np.zeros(0),
+                "intensityMax": np.zeros(0),
+            }
+        return {
+            "intensitySums": np.bincount(inverse, weights=values, minlength=n),
+            "intensitySquareSums": np.bincount(
+                inverse, weights=values * values, minlength=n
+            ),
+            "intensityMin": np.asarray(ndimage.minimum(values, inverse, index)),
+            "intensityMax": np.asarray(ndimage.maximum(values, inverse, index)),
+        }
+
+    def merge(self, partialResults):
+        ndim = self.labels.ndim
+        allIds = np.concatenate([result["ids"] for result in partialResults])
+        self.ids, inverse = np.unique(allIds, return_inverse=True)
+        n = len(self.ids)
+        self.counts = np.bincount(
+            inverse,
+            weights=np.concatenate([r["counts"] for r in partialResults]),
+            minlength=n,
+        ).astype(np.int64)
+        self.coordinateSums = np.zeros((ndim, n))
+        self.bboxMin = np.full((ndim, n), np.iinfo(np.int64).max)
+        self.bboxMax = np.full((ndim, n), -1, dtype=np.int64)
+        for axis in range(ndim):
+            self.coordinateSums[axis] = np.bincount(
+                inverse,
+                weights=np.concatenate([r["sums"][axis] for r in partialResults]),
+                minlength=n,
+            )
+            np.minimum.at(
+                self.bboxMin[axis], inverse,
+                np.concatenate([r["minima"][axis] for r in partialResults]),
+            )
+            np.maximum.at(
+                self.bboxMax[axis], inverse,
+                np.concatenate([r["maxima"][axis] for r in partialResults]),
+            )
+        if self.intensityImage is not None:
+            self.mergeIntensities(partialResults, inverse)
+
+    def mergeIntensities(self, partialResults, inverse):
+        n = len(self.ids)
+        self.intensitySums = np.bincount(
+            inverse,
+            weights=np.concatenate([r["intensitySums"] for r in partialResults]),
+            minlength=n,
+        )
+        self.intensitySquareSums = np.bincount(
+            inverse,
+            weights=np.concatenate(
+                [r["intensitySquareSums"] for r in partialResults]
+            ),
+            minlength=n,
+        )
+        self.intensityMin = np.full(n, np.inf)
+        self.intensityMax = np.full(n, -np.inf)
+        np.minimum.at(
+            self.intensityMin, inverse,
+            np.concatenate([r["intensityMin"] for r in partialResults]),
+        )
+        np.maximum.at(
+            self.intensityMax, inverse,
+            np.concatenate([r["intensityMax"] for r in partialResults]),
+        )
+
+    def getIntensityMean(self):
+        return self.intensitySums / self.counts
+
+    def getIntensityStd(self):
+        mean = self.getIntensityMean()
+        variance = self.intensitySquareSums / self.counts - mean * mean
+        return np.sqrt(np.maximum(variance, 0))
+
+    def getSlices(self):
+        return [
+            tuple(slice(int(start), int(stop) + 1)
+                  for start, stop in zip(starts, stops))
+            for starts, stops in zip(self.bboxMin.T, self.bboxMax.T)
+        ]
+
+
+def _measureObjects(objects, properties, spacing):
+    """Measure the properties of a batch of objects, each given by its
+    label, the crops of the label and intensity images to its bounding box
+    and the offset of the crop."""
+    rows = []
+    for label, labelsCrop, intensityCrop, offset in objects:
+        row = regionprops_table(
+            (labelsCrop == label).astype(np.uint8),
+            intensity_image=intensityCrop,
+            properties=properties,
+            spacing=spacing,
+        )
+        for key in row.keys():
+            if key.startswith("centroid_weighted-"):
+                axis = int(key.split("-")[1])
+                row[key] = row[key] + offset[axis] * spacing[axis]
+        rows.append(row)
+    if not rows:
+        return {}
+    return {key: np.concatenate([row[key] for row in rows]) for key in rows[0]}
 
 
 class MeasureLabels(object):
+    """Measure the properties of the objects in a label image.
+
+    The cheap properties (see getCheapProperties) and, for intensity images
+    without channels, the intensity statistics are calculated for all
+    objects at once in a single, chunked pass over the images. The
+    other properties are only calculated if they are selected, object by
+    object on the crop of its bounding box, in batches that are distributed
+    over a pool of worker processes.
+    """
 
     def __init__(self, labels, intensityImage=None, scale=(1, 1, 1)):
         super().__init__()
@@ -31,6 +385,10 @@ class MeasureLabels(object):
         self.scale = scale
         self.table = None
         self.selectedProperties = {"label", "area"}
+        self.chunkVoxels = 2**22
+        self.batchSize = 256
+        self.nWorkers = None        # None for one worker per cpu
+        self.statistics = None
 
     @classmethod
     def getAllProperties(cls):
@@ -92,8 +450,48 @@ class MeasureLabels(object):
     def getIntensity2DOnlyProperties(cls):
         return ("moments_weighted_hu",)
 
+    @classmethod
+    def getCheapProperties(cls):
+        return (
+            "label",
+            "area",
+            "area_bbox",
+            "bbox",
+            "centroid",
+            "equivalent_diameter_area",
+            "extent",
+        )
+
+    @classmethod
+    def getIntensityStatisticsProperties(cls):
+        return (
+            "intensity_max",
+            "intensity_mean",
+            "intensity_min",
+            "intensity_std",
+        )
+
+    def hasVectorizedIntensityStatistics(self):
+        """Answer whether the intensity statistics can be calculated in the
+        pass over the label image, which is the case for an intensity image
+        without channels."""
+        return (
+            self.intensityImage is not None
+            and self.intensityImage.ndim == self.labels.ndim
+        )
+
+    def getVectorizedProperties(self):
+        properties = self.getCheapProperties()
+        if self.hasVectorizedIntensityStatistics():
+            properties = properties + self.getIntensityStatisticsProperties()
+        return properties
+
+    def getSpacing(self):
+        return tuple(
+            float(value) for value in np.asarray(self.scale)[-self.labels.ndim:]
+        )
+
     def run(self):
-        print("intensity image", self.intensityImage)
         properties = self.selectedProperties.copy()
         if self.intensityImage is None:
             properties = properties - set(self.getIntensityProperties())
@@ -101,9 +499,109 @@ class MeasureLabels(object):
         if self.labels.ndim > 2:
             properties = properties - set(self.get2DOnlyProperties())
             properties = properties - set(self.getIntensity2DOnlyProperties())
-        self.table = regionprops_table(
-            self.labels,
-            properties=properties,
-            intensity_image=self.intensityImage,
-            spacing=self.scale,
+        intensityImage = None
+        if self.hasVectorizedIntensityStatistics():
+            intensityImage = self.intensityImage
+        self.statistics = LabelStatistics(self.labels, intensityImage)
+        self.statistics.chunkVoxels = self.chunkVoxels
+        self.statistics.run()
+        table = self.getCheapPropertiesTable(properties)
+        expensiveProperties = [
+            prop for prop in self.getAllProperties()
+            if prop in properties
+            and prop not in self.getVectorizedProperties()
+        ]
+        if expensiveProperties:
+            columns = {}
+            for batchTable in self.iterateExpensiveProperties(
+                expensiveProperties
+            ):
+                for key, values in batchTable.items():
+                    columns.setdefault(key, []).append(values)
+            for key, values in columns.items():
+                table[key] = np.concatenate(values)
+        self.table = ResultsTable(table)
+
+    def getCheapPropertiesTable(self, properties):
+        """Answer the selected cheap properties and intensity statistics of
+        all objects, calculated from the label statistics, with the same
+        columns and values as regionprops_table."""
+        statistics = self.statistics
+        ndim = self.labels.ndim
+        spacing = np.array(self.getSpacing())
+        voxelSize = float(np.prod(spacing))
+        area = statistics.counts * voxelSize
+        bboxShape = statistics.bboxMax - statistics.bboxMin + 1
+        areaBBox = np.prod(bboxShape, axis=0) * voxelSize
+        table = {}
+        for prop in self.getVectorizedProperties():
+            if prop not in properties:
+                continue
+            if prop == "label":
+                table["label"] = statistics.ids
+            elif prop == "area":
+                table["area"] = area
+            elif prop == "area_bbox":
+                table["area_bbox"] = areaBBox
+            elif prop == "bbox":
+                for axis in range(ndim):
+                    table["bbox-" + str(axis)] = statistics.bboxMin[axis]
+                for axis in range(ndim):
+                    table["bbox-" + str(axis + ndim)] = statistics.bboxMax[axis] + 1
+            elif prop == "centroid":
+                for axis in range(ndim):
+                    table["centroid-" + str(axis)] = (
+                        statistics.coordinateSums[axis] / statistics.counts
+                    ) * spacing[axis]
+            elif prop == "equivalent_diameter_area":
+                table[prop] = (2 * ndim * area / np.pi) ** (1 / ndim)
+            elif prop == "extent":
+                table["extent"] = area / areaBBox
+            elif prop == "intensity_max":
+                table[prop] = statistics.intensityMax
+            elif prop == "intensity_mean":
+                table[prop] = statistics.getIntensityMean()
+            elif prop == "intensity_min":
+                table[prop] = statistics.intensityMin
+            elif prop == "intensity_std":
+                table[prop] = statistics.getIntensityStd()
+        return table
+
+    def iterateExpensiveProperties(self, properties):
+        """Answer the tables of the expensive properties of the objects,
+        batch by batch, in the order of the labels. The batches are
+        measured in worker processes, unless there is only one batch or
+        one worker."""
+        slices = self.statistics.getSlices()
+        batches = [
+            range(start, min(start + self.batchSize, len(slices)))
+            for start in range(0, len(slices), self.batchSize)
+        ]
+        objectBatches = (self.getObjects(batch, slices) for batch in batches)
+        spacing = self.getSpacing()
+        if len(batches) < 2 or self.nWorkers == 1:
+            for objects in objectBatches:
+                yield _measureObjects(objects, properties, spacing)
+            return
+        yield from _imapBounded(
+            _measureObjects,
+            ((objects, properties, spacing) for objects in objectBatches),
+            self.nWorkers,
         )
+
+    def getObjects(self, batch, slices):
+        objects = []
+        for index in batch:
+            bbox = slices[index]
+            intensityCrop = None
+            if self.intensityImage is not None:
+                intensityCrop = np.asarray(self.intensityImage[bbox])
+            objects.append(
+                (
+                    self.statistics.ids[index],
+                    np.asarray(self.labels[bbox]),
+                    intensityCrop,
+                    [s.start for s in bbox],
+                )
+            )
+        return objects
@@ -1,7 +1,11 @@
 from abc import abstractmethod
 
 import numpy as np
-from skimage.morphology import skeletonize
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import maximum_bipartite_matching
+
+from filament_toolbox.lib.array_util import ArrayUtil
+from filament_toolbox.lib.cache import SKELETON_CACHE
 
 
 
@@ -14,19 +18,55 @@ class Metric(object):
         self.mask1 = None
         self.mask2 = None
         self.result = -1
+        self.chunk_voxels = 2**24
+        self.skeleton1 = None
+        self.skeleton2 = None
 
     @abstractmethod
     def calculate(self):
         raise (Exception("Abstract method calculate of class Metric called!"))
 
+    def get_columns(self, name):
+        """Answer the values of the metric by the names of their columns in
+        a table with a row per pair of images."""
+        return {name: self.result}
+
     def calculate_masks(self):
         new_shape = np.maximum(
             np.array(self.labels1.shape), np.array(self.labels2.shape)
         )
-        self.mask1 = np.zeros(new_shape, np.uint8)
-        self.mask2 = np.zeros(new_shape, np.uint8)
-        self.mask1[np.where(self.labels1 > 0)] = 1
-        self.mask2[np.where(self.labels2 > 0)] = 1
+        self.mask1 = np.zeros(new_shape, bool)
+        self.mask2 = np.zeros(new_shape, bool)
+        for labels, mask in ((self.labels1, self.mask1), (self.labels2, self.mask2)):
+            for chunk in ArrayUtil.getSlabs(labels.shape, self.chunk_voxels):
+                np.greater(labels[chunk], 0, out=mask[chunk])
+
+    def calculate_skeletons(self):
+        """Skeletonize the masks, unless the skeletons have been set, for
+        example by another metric calculated on the same images. Skeletons
+        of masks that have been skeletonized before are taken from the
+        skeleton cache."""
+        if self.skeleton1 is None:
+            self.skeleton1 = SKELETON_CACHE.skeletonize(self.mask1)
+        if self.skeleton2 is None:
+            self.skeleton2 = SKELETON_CACHE.skeletonize(self.mask2)
+
+    def count_foreground(self, labels):
+        return sum(
+            int(np.count_nonzero(labels[chunk] > 0))
+            for chunk in ArrayUtil.getSlabs(labels.shape, self.chunk_voxels)
+        )
+
+    def count_foreground_intersection(self):
+        """Count the voxels that are foreground in both label images, in the
+        region in which the two images overlap."""
+        overlap_shape = np.minimum(self.labels1.shape, self.labels2.shape)
+        count = 0
+        for chunk in ArrayUtil.getSlabs(tuple(overlap_shape), self.chunk_voxels):
+            count += int(np.count_nonzero(
+                np.logical_and(self.labels1[chunk] > 0, self.labels2[chunk] > 0)
+            ))
+        return count
 
 
 class Dice(Metric):
@@ -35,11 +75,9 @@ class Dice(Metric):
         super().__init__(labels1, labels2)
 
     def calculate(self):
-        self.calculate_masks()
-        intersection = self.mask1 * self.mask2
-        cardinality_intersection = len(np.where(intersection > 0)[0])
-        cardinality_mask1 = len(np.where(self.mask1 > 0)[0])
-        cardinality_mask2 = len(np.where(self.mask2 > 0)[0])
+        cardinality_intersection = self.count_foreground_intersection()
+        cardinality_mask1 = self.count_foreground(self.labels1)
+        cardinality_mask2 = self.count_foreground(self.labels2)
         self.result = (2 * cardinality_intersection) / (
             cardinality_mask1 + cardinality_mask2
         )
@@ -52,12 +90,9 @@ class CenterlineDice(Metric):
 
     def calculate(self):
         self.calculate_masks()
-        topological_precision = self.cl_score(
-            self.mask1, skeletonize(self.mask2)
-        )
-        topological_sensitivity = self.cl_score(
-            self.mask2, skeletonize(self.mask1)
-        )
+        self.calculate_skeletons()
+        topological_precision = self.cl_score(self.mask1, self.skeleton2)
+        topological_sensitivity = self.cl_score(self.mask2, self.skeleton1)
         self.result = (
             2
             * topological_precision
@@ -67,4 +102,226 @@ class CenterlineDice(Metric):
 
     @classmethod
     def cl_score(cls, volume, skeleton):
-        return np.sum(volume * skeleton) / np.sum(skeleton)
+        return np.count_nonzero(volume & skeleton) / np.count_nonzero(skeleton)
+
+
+class LabelOverlap(Metric):
+    """The sparse contingency matrix of two label images of the same shape.
+
+    The matrix has a row for each label of the first and a column for each
+    label of the second image, including the background 0, and contains the
+    number of voxels in which they overlap. It is built in one pass over the
+    images, chunk by chunk, by counting the pairs of labels of each voxel.
+    """
+
+    def __init__(self, labels1, labels2):
+        super().__init__(labels1, labels2)
+        self.ids1 = None
+        self.ids2 = None
+        self.sizes1 = None
+        self.sizes2 = None
+
+    def calculate(self):
+        if tuple(self.labels1.shape) != tuple(self.labels2.shape):
+            raise ValueError(
+                "The label images must have the same shape, but have the shapes "
+                + str(self.labels1.shape) + " and " + str(self.labels2.shape) + "!"
+            )
+        codes = []
+        counts = []
+        for chunk in ArrayUtil.getSlabs(self.labels1.shape, self.chunk_voxels):
+            pairs = (np.asarray(self.labels1[chunk], np.uint64).ravel() << np.uint64(32)) \
+                | np.asarray(self.labels2[chunk], np.uint64).ravel()
+            chunk_codes, chunk_counts = np.unique(pairs, return_counts=True)
+            codes.append(chunk_codes)
+            counts.append(chunk_counts)
+        codes, inverse = np.unique(np.concatenate(codes), return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=np.concatenate(counts)).astype(np.int64)
+        labels1 = (codes >> np.uint64(32)).astype(np.int64)
+        labels2 = (codes & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        self.ids1, rows = np.unique(labels1, return_inverse=True)
+        self.ids2, columns = np.unique(labels2, return_inverse=True)
+        self.result = coo_matrix(
+            (counts, (rows.ravel(), columns.ravel())),
+            shape=(len(self.ids1), len(self.ids2)),
+        ).tocsr()
+        self.sizes1 = np.asarray(self.result.sum(axis=1)).ravel()
+        self.sizes2 = np.asarray(self.result.sum(axis=0)).ravel()
+
+    def get_iou(self):
+        """Answer the sparse matrix of the intersection over union of the
+        overlapping labels. Rows and columns of the background are zero."""
+        intersections = self.result.tocoo()
+        unions = (
+            self.sizes1[intersections.row]
+            + self.sizes2[intersections.col]
+            - intersections.data
+        )
+        iou = intersections.data / unions
+        foreground = (self.ids1[intersections.row] > 0) & (self.ids2[intersections.col] > 0)
+        iou[~foreground] = 0
+        matrix = coo_matrix((iou, (intersections.row, intersections.col)),
+                            shape=intersections.shape).tocsr()
+        matrix.eliminate_zeros()
+        return matrix
+
+    def match(self, threshold=0.5):
+        """Answer the pairs of matching objects as the indices of their rows
+        and columns. Two objects can match if their intersection over union
+        is larger than the threshold. The matching with the largest number
+        of pairs is returned, which is unique for thresholds of 0.5 and
+        above."""
+        iou = self.get_iou()
+        candidates = iou.multiply(iou > threshold).tocsr()
+        candidates.eliminate_zeros()
+        columns = maximum_bipartite_matching(candidates, perm_type="column")
+        rows = np.flatnonzero(columns >= 0)
+        return rows, columns[rows]
+
+
+class InstanceF1(Metric):
+    """The F1-score of the detection of the objects in labels2 compared to
+    the objects in labels1, matching objects by their intersection over
+    union."""
+
+    def __init__(self, labels1, labels2):
+        super().__init__(labels1, labels2)
+        self.threshold = 0.5
+        self.true_positives = 0
+        self.false_positives = 0
+        self.false_negatives = 0
+        self.precision = 0
+        self.recall = 0
+
+    def calculate(self):
+        overlap = LabelOverlap(self.labels1, self.labels2)
+        overlap.chunk_voxels = self.chunk_voxels
+        overlap.calculate()
+        rows, _ = overlap.match(self.threshold)
+        n_objects1 = int(np.count_nonzero(overlap.ids1))
+        n_objects2 = int(np.count_nonzero(overlap.ids2))
+        self.true_positives = len(rows)
+        self.false_negatives = n_objects1 - self.true_positives
+        self.false_positives = n_objects2 - self.true_positives
+        self.precision = self.true_positives / max(n_objects2, 1)
+        self.recall = self.true_positives / max(n_objects1, 1)
+        self.result = 2 * self.true_positives / max(n_objects1 + n_objects2, 1)
+
+    def get_columns(self, name):
+        return {
+            name: self.result,
+            name + " precision": self.precision,
+            name + " recall": self.recall,
+            name + " TP": self.true_positives,
+            name + " FP": self.false_positives,
+            name + " FN": self.false_negatives,
+        }
+
+
+class InstanceCenterlineDice(Metric):
+    """The centerline Dice of each object in labels1 with the object in
+    labels2 that matches it. Objects without a match have a clDice of 0.
+    The result is the mean over the objects of labels1, the table contains
+    the values of the objects.
+
+    The skeletons of the masks are labelled with the objects they belong to,
+    so that the overlaps of all skeletons with all objects are read from two
+    contingency matrices.
+    """
+
+    def __init__(self, labels1, labels2):
+        super().__init__(labels1, labels2)
+        self.threshold = 0.5
+        self.table = None
+
+    def calculate(self):
+        overlap = self.get_overlap(self.labels1, self.labels2)
+        rows, columns = overlap.match(self.threshold)
+        self.calculate_masks()
+        self.calculate_skeletons()
+        skeleton1 = self.labels1 * self.skeleton1
+        skeleton2 = self.labels2 * self.skeleton2
+        skeleton1_overlap = self.get_overlap(skeleton1, self.labels2)
+        skeleton2_overlap = self.get_overlap(self.labels1, skeleton2)
+        ids1 = overlap.ids1[rows]
+        ids2 = overlap.ids2[columns]
+        sensitivity = self.get_fractions(skeleton1_overlap, ids1, ids2, by_row=True)
+        precision = self.get_fractions(skeleton2_overlap, ids1, ids2, by_row=False)
+        sum_of_scores = precision + sensitivity
+        cl_dice = np.divide(2 * precision * sensitivity, sum_of_scores,
+                            out=np.zeros(len(rows)), where=sum_of_scores > 0)
+        objects = overlap.ids1[overlap.ids1 > 0]
+        values = np.zeros(len(objects))
+        matched_objects = np.full(len(objects), 0, dtype=overlap.ids2.dtype)
+        positions = np.searchsorted(objects, ids1)
+        values[positions] = cl_dice
+        matched_objects[positions] = ids2
+        self.table = {
+            "label 1": objects,
+            "label 2": matched_objects,
+            "clDice": values,
+        }
+        self.result = float(np.mean(values)) if len(values) else 0
+
+    def get_overlap(self, labels1, labels2):
+        overlap = LabelOverlap(labels1, labels2)
+        overlap.chunk_voxels = self.chunk_voxels
+        overlap.calculate()
+        return overlap
+
+    @classmethod
+    def get_fractions(cls, skeleton_overlap, ids1, ids2, by_row):
+        """Answer for each pair of objects the fraction of the skeleton of
+        one object that lies within the other object."""
+        if len(ids1) == 0:
+            return np.zeros(0)
+        rows = np.searchsorted(skeleton_overlap.ids1, ids1)
+        columns = np.searchsorted(skeleton_overlap.ids2, ids2)
+        found = (rows < len(skeleton_overlap.ids1)) & (columns < len(skeleton_overlap.ids2))
+        rows = np.minimum(rows, len(skeleton_overlap.ids1) - 1)
+        columns = np.minimum(columns, len(skeleton_overlap.ids2) - 1)
+        found &= (skeleton_overlap.ids1[rows] == ids1) & (skeleton_overlap.ids2[columns] == ids2)
+        intersections = np.asarray(skeleton_overlap.result[rows, columns]).ravel()
+        sizes = skeleton_overlap.sizes1[rows] if by_row else skeleton_overlap.sizes2[columns]
+        return np.divide(intersections, sizes, out=np.zeros(len(ids1)),
+                         where=found & (sizes > 0))
+
+
+METRICS = {
+    "Dice": Dice,
+    "clDice": CenterlineDice,
+    "F1": InstanceF1,
+    "instance clDice": InstanceCenterlineDice,
+}
+
+
+class MetricsEvaluation(object):
+    """Calculate several metrics of the same pair of label images. The
+    skeletons are calculated only once and shared by the metrics.
+
+    The result holds the values of the metrics by the names of their
+    columns, including the counts of the F1-score, and tables the tables of
+    the metrics that have a value per object, by the name of the metric.
+    """
+
+    def __init__(self, labels1, labels2, metrics=("Dice", "clDice")):
+        super().__init__()
+        self.labels1 = labels1
+        self.labels2 = labels2
+        self.metrics = metrics
+        self.result = None
+        self.tables = None
+
+    def run(self):
+        self.result = {}
+        self.tables = {}
+        skeletons = (None, None)
+        for name in self.metrics:
+            metric = METRICS[name](self.labels1, self.labels2)
+            metric.skeleton1, metric.skeleton2 = skeletons
+            metric.calculate()
+            skeletons = (metric.skeleton1, metric.skeleton2)
+            self.result.update(metric.get_columns(name))
+            table = getattr(metric, "table", None)
+            if table is not None:
+                self.tables[name] = table
@@ -1,23 +1,84 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import joblib
 import numpy as np
-from skimage import data, segmentation, feature, future
+import sklearn
+from skimage import data, segmentation, feature
+from sklearn.ensemble import HistGradientBoostingClassifier
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.neural_network import MLPClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
 from functools import partial
+from threadpoolctl import threadpool_limits
+
+from filament_toolbox.lib.array_util import ArrayUtil
+from filament_toolbox.lib.synthetic import SyntheticFilaments
+
+
+MODEL_FORMAT_VERSION = 2
+
+
+
+def get_labels_dtype(max_label):
+    """Answer the smallest unsigned integer type that holds the labels up
+    to max_label."""
+    return np.min_scalar_type(max(int(max_label), 0))
+
+
+
+class FeatureQuantizer(object):
+    """Quantize each feature to 8 bits, using the range of the feature in
+    the training data. Values outside of that range are clipped."""
+
+
+    def __init__(self, minimum=None, scale=None):
+        super().__init__()
+        self.minimum = minimum
+        self.scale = scale
+
+
+    def fit(self, features):
+        self.minimum = features.min(axis=0).astype(np.float32)
+        value_range = features.max(axis=0) - self.minimum
+        self.scale = (255 / np.where(value_range > 0, value_range, 1)).astype(np.float32)
+        return self
+
+
+    def transform(self, features):
+        quantized = (features - self.minimum) * self.scale
+        np.clip(quantized, 0, 255, out=quantized)
+        return np.rint(quantized, out=quantized).astype(np.uint8)
 
 
 
-class RandomForestPixelClassifier(object):
+class PixelClassifier(object):
 
 
     def __init__(self, image):
         super().__init__()
         self.image = image
+        self.backend = "random forest"
+        self.backends = {
+            "random forest": self.create_random_forest,
+            "hist gradient boosting": self.create_hist_gradient_boosting,
+            "logistic regression": self.create_logistic_regression,
+            "mlp": self.create_mlp,
+        }
+        self.quantize_features = False     # the quantizer clips features outside of the training range
+        self.quantizer = None
         self.intensity = False
         self.edges = True
         self.texture = True
         self.sigma_min = 1
         self.sigma_max = 16
         self.channel_axis = None     # None for single channel images
-        self.training_labels = np.zeros(self.image.shape, dtype=np.uint8)   # zeros mean as yet unclassified
+        self.training_labels = None     # zeros mean as yet unclassified
         self.features = None
         self.classifier = None
         self.features_func = None
@@ -28,40 +89,526 @@ class RandomForestPixelClassifier(object):
         self.num_sigma = None
         self.training_points = None
         self.training_points_classes = None
+        self.training_labels_image = None       # dense annotations, used instead of the points if set
+        self.classes = []
+        self.incremental = False
+        self.n_new_estimators = 10
+        self.max_estimators = None      # None for no limit
+        self.training_targets = None
+        self.training_indices = None    # flat indices of the voxels for which the features are known
+        self.trained_image = None
+        self.trained_feature_parameters = None
+        self.trained_estimator_parameters = None
+        self.tile_size = 64
+        self.prediction_tile_size = 128     # raised to four times the halo
+        self.n_workers = None       # None for one worker per cpu
+        self.max_memory = 2**31     # for the features of the tiles predicted at the same time
+        self.output = None          # optional preallocated (or zarr) array for the result
+        self.calculate_probabilities = False
+        self.probabilities_dtype = np.uint8     # np.uint8 (quantized to 0-255) or np.float16
+        self.probabilities = None
+        self.probabilities_output = None        # optional preallocated array of shape (classes,) + spatial shape
 
 
     def train(self):
+        """Train the classifier on the annotations.
+
+        In incremental mode a classifier trained before on the same image with
+        the same feature parameters, backend, n_estimators and max_depth is
+        kept. The features of the annotations that were already known are
+        reused and only the features of the new annotations are calculated.
+        A random forest is grown by n_new_estimators trees. If max_estimators
+        is set, the oldest trees are removed so that the forest does not grow
+        beyond it. The other backends are refitted on the cached features.
+        """
         self.calculate_training_labels()
-        self.features_func = partial(
-            feature.multiscale_basic_features,
-            intensity=self.intensity,
-            edges=self.edges,
-            texture=self.texture,
-            sigma_min=self.sigma_min,
-            sigma_max=self.sigma_max,
-            num_sigma=self.num_sigma,
-            channel_axis=self.channel_axis,
+        self.features_func = self.create_features_func()
+        coordinates = np.stack(np.nonzero(self.training_labels), axis=-1)
+        targets = self.training_labels[tuple(coordinates.T)]
+        indices = np.ravel_multi_index(tuple(coordinates.T), self.training_labels.shape)
+        if self.can_train_incrementally(targets):
+            self.train_incrementally(coordinates, targets, indices)
+            return
+        features = self.calculate_training_features(coordinates)
+        self.quantizer = None
+        if self.quantize_features:
+            self.quantizer = FeatureQuantizer().fit(features)
+        self.features = self.prepare_features(features)
+        self.classifier = self.backends[self.backend]()
+        self.classifier.fit(self.features, targets)
+        self.remember_training_data(targets, indices)
+
+
+    def create_random_forest(self):
+        return RandomForestClassifier(n_estimators=self.n_estimators,
+                                      n_jobs=self.n_jobs,
+                                      max_depth=self.max_depth)
+
+
+    def create_hist_gradient_boosting(self):
+        return HistGradientBoostingClassifier(max_iter=self.n_estimators,
+                                              max_depth=self.max_depth)
+
+
+    def create_logistic_regression(self):
+        return make_pipeline(StandardScaler(), LogisticRegression(max_iter=500))
+
+
+    def create_mlp(self):
+        return make_pipeline(StandardScaler(),
+                             MLPClassifier(hidden_layer_sizes=(32,), max_iter=500))
+
+
+    def prepare_features(self, features):
+        if self.quantizer is None:
+            return features
+        return self.quantizer.transform(features)
+
+
+    def can_train_incrementally(self, targets):
+        return (self.incremental
+                and self.classifier is not None
+                and self.features is not None
+                and self.trained_image is self.image
+                and self.trained_feature_parameters == self.get_feature_parameters()
+                and self.trained_estimator_parameters == self.get_estimator_parameters()
+                and np.array_equal(np.unique(targets), self.classifier.classes_))
+
+
+    def train_incrementally(self, coordinates, targets, indices):
+        if (np.array_equal(indices, self.training_indices)
+                and np.array_equal(targets, self.training_targets)):
+            return
+        known = np.isin(indices, self.training_indices, assume_unique=True)
+        positions = np.searchsorted(self.training_indices, indices[known])
+        features = np.empty((len(indices), self.features.shape[-1]),
+                            dtype=self.features.dtype)
+        features[known] = self.features[positions]
+        if not known.all():
+            new_features = self.calculate_training_features(coordinates[~known])
+            features[~known] = self.prepare_features(new_features)
+        self.features = features
+        if not isinstance(self.classifier, RandomForestClassifier):
+            self.classifier = self.backends[self.backend]()
+            self.classifier.fit(self.features, targets)
+            self.remember_training_data(targets, indices)
+            return
+        estimators = self.classifier.estimators_
+        if self.max_estimators:
+            n_removed = len(estimators) + self.n_new_estimators - self.max_estimators
+            if n_removed > 0:
+                self.classifier.estimators_ = estimators[n_removed:]
+        self.classifier.set_params(
+            warm_start=True,
+            n_estimators=len(self.classifier.estimators_) + self.n_new_estimators
         )
-        self.features = self.features_func(self.image)
-        self.classifier = RandomForestClassifier(n_estimators=self.n_estimators,
-                                                 n_jobs=self.n_jobs,
-                                                 max_depth=self.max_depth)
-        self.classifier = future.fit_segmenter(self.training_labels, self.features, self.classifier)
+        self.classifier.fit(self.features, targets)
+        self.remember_training_data(targets, indices)
+
+
+    def remember_training_data(self, targets, indices):
+        self.training_targets = targets
+        self.training_indices = indices
+        self.trained_image = self.image
+        self.trained_feature_parameters = self.get_feature_parameters()
+        self.trained_estimator_parameters = self.get_estimator_parameters()
+
+
+    def get_estimator_parameters(self):
+        return {
+            "backend": self.backend,
+            "n_estimators": self.n_estimators,
+            "max_depth": self.max_depth,
+        }
+
+
+    def create_features_func(self):
+        return partial(feature.multiscale_basic_features,
+                       **self.get_feature_parameters())
+
+
+    def get_feature_parameters(self):
+        return {
+            "intensity": self.intensity,
+            "edges": self.edges,
+            "texture": self.texture,
+            "sigma_min": self.sigma_min,
+            "sigma_max": self.sigma_max,
+            "num_sigma": self.num_sigma,
+            "channel_axis": self.channel_axis,
+        }
+
+
+    def save(self, path):
+        """Save the trained classifier to path with joblib and its feature
+        configuration to a json file next to it, with the same name and the
+        extension .json."""
+        joblib.dump(self.classifier, path)
+        metadata = {
+            "format_version": MODEL_FORMAT_VERSION,
+            "sklearn_version": sklearn.__version__,
+            "classifier": type(self.classifier).__name__,
+            "backend": self.backend,
+            "classes": self.classifier.classes_.tolist(),
+            "class_names": self.classes,
+            "features": self.get_feature_parameters(),
+            "quantizer": None,
+        }
+        if self.quantizer is not None:
+            metadata["quantizer"] = {
+                "minimum": self.quantizer.minimum.tolist(),
+                "scale": self.quantizer.scale.tolist(),
+            }
+        with open(self.get_metadata_path(path), "w") as f:
+            json.dump(metadata, f, indent=4)
+
+
+    @classmethod
+    def load(cls, path, image=None):
+        """Load a classifier saved with save. The returned pixel classifier
+        can predict without being trained."""
+        with open(cls.get_metadata_path(path), "r") as f:
+            metadata = json.load(f)
+        if metadata["format_version"] > MODEL_FORMAT_VERSION:
+            raise ValueError(
+                "The model " + path + " has the format version "
+                + str(metadata["format_version"])
+                + ", the newest supported version is "
+                + str(MODEL_FORMAT_VERSION) + "!"
+            )
+        pixel_classifier = cls(image)
+        for key, value in metadata["features"].items():
+            setattr(pixel_classifier, key, value)
+        pixel_classifier.classes = metadata.get("class_names", [])
+        pixel_classifier.backend = metadata.get("backend", "random forest")
+        quantizer = metadata.get("quantizer")
+        pixel_classifier.quantize_features = quantizer is not None
+        if quantizer is not None:
+            pixel_classifier.quantizer = FeatureQuantizer(
+                np.array(quantizer["minimum"], dtype=np.float32),
+                np.array(quantizer["scale"], dtype=np.float32),
+            )
+        pixel_classifier.classifier = joblib.load(path)
+        pixel_classifier.features_func = pixel_classifier.create_features_func()
+        return pixel_classifier
+
+
+    @staticmethod
+    def get_metadata_path(path):
+        return os.path.splitext(path)[0] + ".json"
+
+
+    def get_halo(self):
+        """The distance up to which a voxel influences the features of
+        another voxel. The gaussian kernels are truncated at four sigma and
+        the second derivatives of the texture features add two voxels."""
+        return int(np.ceil(4 * self.sigma_max)) + 2
+
+
+    def calculate_training_features(self, coordinates):
+        """Calculate the features of the labelled voxels at the given
+        coordinates only.
+
+        The labelled voxels are grouped by the tile they fall into. For each
+        tile the window of its labelled voxels, enlarged by the halo, is
+        calculated and overlapping windows are merged, so that no voxel has
+        its features calculated twice. The features are calculated on the
+        windows, unless together they are not smaller than the image, in
+        which case they are calculated on the whole image at once.
+        """
+        spatial_shape = np.array(self.training_labels.shape)
+        windows = self.get_training_windows(coordinates, spatial_shape)
+        volume = sum(int(np.prod(end - start)) for start, end, _ in windows)
+        if volume >= np.prod(spatial_shape):
+            windows = [(np.zeros_like(spatial_shape), spatial_shape,
+                        np.arange(len(coordinates)))]
+        features = None
+        for start, end, rows in windows:
+            window = tuple(slice(a, b) for a, b in zip(start, end))
+            window_features = self.features_func(self.get_window(window))
+            local_coordinates = tuple((coordinates[rows] - start).T)
+            if features is None:
+                features = np.empty((len(coordinates), window_features.shape[-1]),
+                                    dtype=window_features.dtype)
+            features[rows] = window_features[local_coordinates]
+        return features
+
+
+    def get_training_windows(self, coordinates, spatial_shape):
+        """Answer the windows, as start, end and the rows of the coordinates
+        in them, on which the features of the labelled voxels are
+        calculated. Windows that overlap are replaced by their bounding box
+        until no two windows overlap."""
+        _, tile_indices = np.unique(coordinates // self.tile_size, axis=0,
+                                    return_inverse=True)
+        tile_indices = tile_indices.ravel()
+        halo = self.get_halo()
+        order = np.argsort(tile_indices, kind="stable")
+        tile_ends = np.cumsum(np.bincount(tile_indices))
+        starts = []
+        ends = []
+        rows = []
+        for tile_rows in np.split(order, tile_ends[:-1]):
+            tile_coordinates = coordinates[tile_rows]
+            starts.append(np.maximum(tile_coordinates.min(axis=0) - halo, 0))
+            ends.append(np.minimum(tile_coordinates.max(axis=0) + 1 + halo, spatial_shape))
+            rows.append(tile_rows)
+        starts = np.array(starts)
+        ends = np.array(ends)
+        merged = True
+        while merged:
+            merged = False
+            index = 0
+            while index < len(rows):
+                overlapping = np.all((starts < ends[index]) & (ends > starts[index]),
+                                     axis=1)
+                overlapping[index] = False
+                if not overlapping.any():
+                    index += 1
+                    continue
+                others = np.flatnonzero(overlapping)
+                starts[index] = np.minimum(starts[index], starts[others].min(axis=0))
+                ends[index] = np.maximum(ends[index], ends[others].max(axis=0))
+                rows[index] = np.concatenate([rows[index]] + [rows[other] for other in others])
+                keep = ~overlapping
+                starts = starts[keep]
+                ends = ends[keep]
+                rows = [tile_rows for tile_rows, kept in zip(rows, keep) if kept]
+                index = int(np.count_nonzero(keep[:index]))
+                merged = True
+        return list(zip(starts, ends, rows))
 
 
     def predict(self):
-        features_new = self.features_func(self.image)
-        self.result = future.predict_segmenter(features_new, self.classifier)
+        """Classify the image tile by tile.
+
+        If the features of the whole image fit into max_memory, the image is
+        a single tile. Otherwise the features of each tile are calculated on
+        the tile padded by the halo, classified and written into the result,
+        so that only the features of the tiles currently being processed
+        are held in memory. The tiles are at least four times as large as the halo, so that
+        the features of the halos add less than the features of the tiles,
+        and they are aligned to the chunks of the outputs, so that no two
+        tiles write into the same chunk. The tiles are distributed over a
+        pool of worker threads, with no more workers than the features of
+        their tiles fit into max_memory. Each worker calculates the features
+        and classifies with a single thread. If calculate_probabilities is
+        set, the probability map of each class is written as well, with the
+        classes along the first axis.
+        """
+        self.result = self.output
+        if self.result is None:
+            self.result = np.zeros(self.get_spatial_shape(),
+                                   dtype=get_labels_dtype(self.classifier.classes_.max()))
+        self.probabilities = None
+        if self.calculate_probabilities:
+            self.probabilities = self.probabilities_output
+            if self.probabilities is None:
+                shape = (len(self.classifier.classes_),) + self.get_spatial_shape()
+                self.probabilities = np.zeros(shape, dtype=self.probabilities_dtype)
+        tile_shape = self.get_prediction_tile_shape()
+        tiles = list(ArrayUtil.getTiles(self.get_spatial_shape(), tile_shape,
+                                        self.get_halo()))
+        n_workers = self.get_number_of_prediction_workers(tile_shape, len(tiles))
+        features_func = self.features_func
+        limits = nullcontext()
+        n_jobs = None
+        if n_workers > 1:
+            features_func = partial(self.features_func, workers=1)
+            limits = threadpool_limits(limits=1)
+            n_jobs = self.set_n_jobs(1)
+        try:
+            with limits, ThreadPoolExecutor(max_workers=n_workers) as executor:
+                for _ in executor.map(partial(self.predict_tile, features_func), tiles):
+                    pass
+        finally:
+            if n_jobs is not None:
+                self.set_n_jobs(n_jobs)
+
+
+    def get_prediction_tile_shape(self):
+        """Answer the shape of the tiles of the prediction, the whole image
+        if its features fit into max_memory, else at least four times the
+        halo and a multiple of the chunks of the outputs."""
+        spatial_shape = self.get_spatial_shape()
+        if self.get_features_bytes(spatial_shape) <= self.max_memory:
+            return tuple(spatial_shape)
+        ndim = len(spatial_shape)
+        size = max(self.prediction_tile_size, 4 * self.get_halo())
+        multiples = np.ones(ndim, dtype=int)
+        for output, first_axis in ((self.output, 0), (self.probabilities, 1)):
+            chunks = getattr(output, "chunks", None)
+            if isinstance(output, np.ndarray) or chunks is None:
+                continue
+            multiples = np.lcm(multiples, np.array(chunks[first_axis:], dtype=int))
+        return tuple(int(multiple * np.ceil(size / multiple)) for multiple in multiples)
+
+
+    def get_number_of_prediction_workers(self, tile_shape, n_tiles):
+        """Answer the number of worker threads, limited by the number of
+        cpus or n_workers, by the number of tiles and by the number of
+        padded tiles whose features fit into max_memory."""
+        padded_shape = np.minimum(np.array(tile_shape) + 2 * self.get_halo(),
+                                  self.get_spatial_shape())
+        tile_bytes = self.get_features_bytes(padded_shape)
+        n_workers = self.n_workers or os.cpu_count() or 1
+        return max(1, min(n_workers, n_tiles, self.max_memory // max(tile_bytes, 1)))
+
+
+    def get_features_bytes(self, shape):
+        """The memory taken by the features of a region of the given shape,
+        which are float32 and held twice while they are stacked."""
+        return int(np.prod(shape)) * self.get_number_of_features() * 4 * 2
+
+
+    def get_number_of_features(self):
+        num_sigma = self.num_sigma
+        if num_sigma is None:
+            num_sigma = int(np.log2(self.sigma_max) - np.log2(self.sigma_min) + 1)
+        ndim = len(self.get_spatial_shape())
+        per_sigma = int(self.intensity) + int(self.edges) + ndim * int(self.texture)
+        n_channels = 1
+        if self.channel_axis is not None:
+            n_channels = self.image.shape[self.channel_axis]
+        return num_sigma * per_sigma * n_channels
+
+
+    def set_n_jobs(self, n_jobs):
+        """Set the number of jobs of the classifier, if it has one, and
+        answer the number it had before, or None."""
+        if self.classifier is None or "n_jobs" not in self.classifier.get_params():
+            return None
+        previous = self.classifier.get_params()["n_jobs"]
+        self.classifier.set_params(n_jobs=n_jobs)
+        return previous
+
+
+    def predict_tile(self, features_func, tile):
+        padded, inner, inner_in_padded = tile
+        features = features_func(self.get_window(padded))[inner_in_padded]
+        tile_shape = features.shape[:-1]
+        features = self.prepare_features(features.reshape(-1, features.shape[-1]))
+        if not self.calculate_probabilities:
+            labels = self.classifier.predict(features)
+            self.result[inner] = labels.reshape(tile_shape)
+            return
+        probabilities = self.classifier.predict_proba(features)
+        labels = self.classifier.classes_[np.argmax(probabilities, axis=1)]
+        self.result[inner] = labels.reshape(tile_shape)
+        probabilities = np.moveaxis(probabilities, -1, 0).reshape((-1,) + tile_shape)
+        self.probabilities[(slice(None),) + inner] = self.quantize_probabilities(probabilities)
+
+
+    def quantize_probabilities(self, probabilities):
+        if np.dtype(self.probabilities_dtype) == np.uint8:
+            return np.rint(probabilities * 255).astype(np.uint8)
+        return probabilities.astype(self.probabilities_dtype)
+
+
+    def get_spatial_shape(self):
+        if self.channel_axis is None:
+            return self.image.shape
+        channel_axis = self.channel_axis % self.image.ndim
+        return self.image.shape[:channel_axis] + self.image.shape[channel_axis + 1:]
+
+
+    def get_window(self, slices):
+        """Answer the region of the image given by the slices of the
+        spatial axes, with all channels."""
+        window = list(slices)
+        if self.channel_axis is not None:
+            window.insert(self.channel_axis % self.image.ndim, slice(None))
+        return self.image[tuple(window)]
 
 
     def calculate_training_labels(self):
-        points = self.training_points
-        self.training_labels = np.zeros(self.image.shape, np.uint8)
-        classes = list(set(self.training_points_classes))
-        if self.image.ndim == 2:
-            for index, (y, x) in enumerate(points):
-                self.training_labels[int(round(y))][int(round(x))] = classes.index(self.training_points_classes[index]) + 1
-        if self.image.ndim == 3:
-            for index, (z, y, x) in enumerate(points):
-                self.training_labels[int(round(z))][int(round(y))][int(round(x))] = classes.index(self.training_points_classes[index]) + 1
+        """Create the image of the training labels from the annotations.
+
+        If a dense annotation image (for example the data of a labels layer)
+        is set as training_labels_image, it is used directly. Otherwise the
+        training points are rasterized, the label of a point being the index
+        of its class in classes plus one. New classes are appended to
+        classes, so that the labels of known classes do not change.
+        """
+        if self.training_labels_image is not None:
+            self.training_labels = self.training_labels_image
+            return
+        names, inverse = np.unique(np.asarray(self.training_points_classes),
+                                   return_inverse=True)
+        for name in names:
+            if name not in self.classes:
+                self.classes.append(str(name))
+        dtype = get_labels_dtype(len(self.classes))
+        self.training_labels = np.zeros(self.get_spatial_shape(), dtype)
+        class_labels = np.array([self.classes.index(name) + 1 for name in names],
+                                dtype=dtype)
+        coordinates = np.rint(np.asarray(self.training_points)).astype(np.intp)
+        inside = np.all((coordinates >= 0) & (coordinates < self.training_labels.shape),
+                        axis=1)
+        self.training_labels[tuple(coordinates[inside].T)] = class_labels[inverse.ravel()[inside]]
+
+
+
+class RandomForestPixelClassifier(PixelClassifier):
+
 
+    def __init__(self, image):
+        super().__init__(image)
+        self.backend = "random forest"
+
+
+
+class PixelClassifierBenchmark(object):
+    """Compare the classifier backends on a synthetic filament image.
+
+    Each backend is trained on randomly sampled voxels of the ground truth
+    and then classifies the whole image. The table contains the training
+    time, the prediction throughput and the accuracy of the prediction.
+    """
+
+
+    def __init__(self, backends=None):
+        super().__init__()
+        self.backends = backends
+        self.n_training_points = 500
+        self.sigma_max = 4
+        self.quantize_features = True
+        self.seed = 0
+        self.dataset = SyntheticFilaments()
+        self.table = None
+
+
+    def run(self):
+        self.dataset.run()
+        image = self.dataset.result
+        ground_truth = self.dataset.labels + 1
+        rng = np.random.default_rng(self.seed)
+        points = np.stack(
+            [rng.integers(0, size, self.n_training_points) for size in image.shape],
+            axis=-1,
+        )
+        backends = self.backends
+        if backends is None:
+            backends = list(PixelClassifier(image).backends.keys())
+        self.table = {
+            "backend": [], "train time [s]": [], "predict time [s]": [],
+            "voxels/s": [], "accuracy": [],
+        }
+        for backend in backends:
+            classifier = PixelClassifier(image)
+            classifier.backend = backend
+            classifier.sigma_max = self.sigma_max
+            classifier.quantize_features = self.quantize_features
+            classifier.training_labels_image = np.zeros(image.shape, ground_truth.dtype)
+            classifier.training_labels_image[tuple(points.T)] = ground_truth[tuple(points.T)]
+            start = time.perf_counter()
+            classifier.train()
+            train_time = time.perf_counter() - start
+            start = time.perf_counter()
+            classifier.predict()
+            predict_time = time.perf_counter() - start
+            self.table["backend"].append(backend)
+            self.table["train time [s]"].append(train_time)
+            self.table["predict time [s]"].append(predict_time)
+            self.table["voxels/s"].append(image.size / predict_time)
+            self.table["accuracy"].append(np.mean(classifier.result == ground_truth))
@@ -1,5 +1,3 @@
-import kimimaro
-import localthickness as lt
 import numpy as np
 from scipy.ndimage import distance_transform_edt
 from skimage.draw import line_nd
@@ -12,15 +10,10 @@ from skimage.morphology import opening
 from skimage.morphology import remove_small_objects
 from skimage.morphology import skeletonize
 
+from filament_toolbox.lib.cache import SKELETON_CACHE
 from filament_toolbox.lib.filter import Filter
 from filament_toolbox.lib.filter import FilterWithSE
 
-try:
-    import cv2
-    from pyhjs import PyHJS, BinaryFrame
-except Exception as e:
-    print(f"Could not import PyHJS: {e}")
-
 
 class Dilation(FilterWithSE):
 
@@ -131,6 +124,8 @@ class MedialAxisTransform(Filter):
             self.distances = self.distances * self.anisotropy[0]
 
     def runKimimaro(self):
+        import kimimaro
+
         teasarParams = {
             "scale": self.scale,
             "const": self.const,  # physical units
@@ -179,9 +174,15 @@ class Skeletonize(Filter):
         super().__init__(input_image)
         self.method = "zhang"
         self.methods = ["lee", "zhang"]
+        self.use_cache = True       # False to bypass the skeleton cache
 
     def run(self):
-        self.result = skeletonize(self.image, method=self.method)
+        if not self.use_cache:
+            self.result = skeletonize(self.image, method=self.method)
+            return
+        self.result = SKELETON_CACHE.skeletonize(
+            self.image, method=self.method
+        ).copy()
 
 
 class HamiltonJacobiSkeleton(Filter):
@@ -193,6 +194,9 @@ class HamiltonJacobiSkeleton(Filter):
         self.use_anisotropic_diffusion = False
 
     def run(self):
+        from pyhjs import BinaryFrame
+        from pyhjs import PyHJS
+
         hjs = PyHJS(self.flux_threshold, self.dilation)
         frame = BinaryFrame(self.image)
         hjs.compute(
@@ -206,6 +210,8 @@ class HamiltonJacobiSkeleton(Filter):
         self.result = skeleton
 
     def get_separate_skeleton_mask(self, skeleton_image):
+        import cv2
+
         # TODO: rename img_kel
         kernel = np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]])
 
@@ -226,6 +232,8 @@ class HamiltonJacobiSkeleton(Filter):
         dilate_kernel_size=9,
         edge_redundant_threshold=50,
     ):
+        import cv2
+
         # Get below masks
         # - end points
         # - junction points
@@ -262,6 +270,8 @@ class HamiltonJacobiSkeleton(Filter):
     ### (2) Redundant skeleton-edge removal
     # build graph from skeleton
     def get_binary_image_contour(self, binary_image):
+        import cv2
+
         contours, hierarchy = cv2.findContours(
             binary_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE
         )
@@ -294,6 +304,8 @@ class LocalThickness(Filter):
         return self.spacing
 
     def run(self):
+        import localthickness as lt
+
         if self.usePhysicalUnits:
             imageSpacing = self.getSpacing()
             edtSpacing = (1, 1)
@@ -1,6 +1,10 @@
+import weakref
+import numpy as np
 from napari.layers.labels.labels import Labels
 from napari.layers.points.points import Points
 from napari.layers.image.image import Image
+from napari.qt.threading import create_worker
+from filament_toolbox.lib.histogram import ImageStatistics
 
 
 
@@ -80,6 +84,91 @@ class NapariUtil:
         return layer.data, layer.scale, str(layer.units[0])
 
 
+    def getVisibleRegion(self, layer):
+        """ Return the region of the data of the layer that is visible in the
+        canvas, that is the current slice in the axes that are not displayed
+        and the part of the displayed plane that is inside the canvas.
+
+        :param layer: An image or labels layer, that is not multiscale
+        :return: A tuple of slices, one for each axis of the layer, or None if
+                 the viewer displays the data in 3D
+        """
+        if self.viewer.dims.ndisplay != 2:
+            return None
+        shape = np.array(layer.data.shape)
+        offset = self.viewer.dims.ndim - layer.ndim
+        displayed = [axis - offset for axis in self.viewer.dims.displayed
+                     if axis >= offset]
+        point = np.round(layer.world_to_data(self.viewer.dims.point)).astype(int)
+        corners = np.asarray(layer.corner_pixels).astype(int)
+        region = []
+        for axis in range(layer.ndim):
+            if axis in displayed:
+                start = int(np.clip(corners[0, axis], 0, shape[axis]))
+                stop = int(np.clip(corners[1, axis] + 1, start, shape[axis]))
+            else:
+                start = int(np.clip(point[axis], 0, shape[axis] - 1))
+                stop = start + 1
+            region.append(slice(start, stop))
+        return tuple(region)
+
+
+    def showPreview(self, previewLayer, data, layer, region, name, labels=True):
+        """ Display data, calculated for a region of the data of the layer, at
+        the position of the region, in the preview layer. The preview layer is
+        created if it does not exist or has been removed from the viewer.
+
+        :param previewLayer: The preview layer or None
+        :param data: The data of the preview, with the shape of the region
+        :param layer: The layer from which the preview has been calculated
+        :param region: A tuple of slices, the region of the data of the layer
+        :param name: The name of a new preview layer
+        :param labels: Whether the preview layer is a labels or an image layer
+        :return: The preview layer
+        """
+        scale = np.asarray(layer.scale)
+        translate = np.asarray(layer.translate) + scale * np.array(
+            [axisSlice.start for axisSlice in region]
+        )
+        if previewLayer is None or previewLayer not in self.viewer.layers:
+            addLayer = self.viewer.add_labels if labels else self.viewer.add_image
+            return addLayer(data, name=name, scale=scale, translate=translate,
+                            blending="additive")
+        previewLayer.data = data
+        previewLayer.translate = translate
+        if not labels:
+            previewLayer.reset_contrast_limits()
+        return previewLayer
+
+
+    @staticmethod
+    def replaceLayerData(layer, data):
+        """ Replace the data of the layer. If the new data has the shape and
+        the type of the old data, it is copied into the buffer of the layer,
+        so that no new volume is allocated and the layer stays editable even
+        if the new data is read-only. Otherwise a labels layer gets a copy of
+        read-only data, so that it can still be painted.
+
+        :param layer: An image or labels layer
+        :param data: The new data of the layer
+        """
+        old = layer.data
+        if (
+            isinstance(old, np.ndarray)
+            and old is not data
+            and old.flags.writeable
+            and old.shape == data.shape
+            and old.dtype == data.dtype
+        ):
+            np.copyto(old, data)
+            LAYER_STATISTICS.invalidate(layer)  # the copy emits no data event
+            layer.refresh()
+        elif isinstance(layer, Labels) and not data.flags.writeable:
+            layer.data = data.copy()    # labels must stay paintable
+        else:
+            layer.data = data
+
+
     @staticmethod
     def getOriginalPath(layer):
         if 'original_path' in layer.metadata.keys():
@@ -94,3 +183,82 @@ class NapariUtil:
         path = NapariUtil.getOriginalPath(srcLayer)
         destLayer.metadata['original_path'] = path
 
+
+
+class LayerStatisticsCache:
+    """ The statistics and the histogram of the data of image layers. The
+    statistics of a layer are calculated once, in a background worker, and
+    are dropped when the data of the layer changes.
+    """
+
+    def __init__(self):
+        self.statistics = weakref.WeakKeyDictionary()
+        self.versions = weakref.WeakKeyDictionary()
+        self.callbacks = weakref.WeakKeyDictionary()
+
+
+    def get(self, layer):
+        """ Return the statistics of the layer if they have been calculated
+        and None otherwise.
+        """
+        return self.statistics.get(layer)
+
+
+    def request(self, layer, callback):
+        """ Call callback with the statistics of the layer, immediately if
+        they are known and otherwise when the background worker that
+        calculates them has finished.
+
+        :param layer: An image layer
+        :param callback: A function with the statistics, an ImageStatistics
+                         object, as parameter
+        """
+        statistics = self.get(layer)
+        if statistics is not None:
+            callback(statistics)
+            return
+        if layer in self.callbacks:
+            self.callbacks[layer].append(callback)
+            return
+        if layer not in self.versions:
+            self.versions[layer] = 0
+            layer.events.data.connect(self.onDataChanged)
+        self.callbacks[layer] = [callback]
+        data = layer.data[-1] if layer.multiscale else layer.data
+        statistics = ImageStatistics(data)
+        version = self.versions[layer]
+        worker = create_worker(statistics.run)
+        worker.returned.connect(
+            lambda _: self.onStatisticsCalculated(layer, statistics, version)
+        )
+        worker.errored.connect(lambda _: self.callbacks.pop(layer, None))
+        worker.start()
+
+
+    def onStatisticsCalculated(self, layer, statistics, version):
+        callbacks = self.callbacks.pop(layer, [])
+        if version != self.versions.get(layer):
+            for callback in callbacks:
+                self.request(layer, callback)
+            return
+        self.statistics[layer] = statistics
+        for callback in callbacks:
+            callback(statistics)
+
+
+    def onDataChanged(self, event):
+        self.invalidate(event.source)
+
+
+    def invalidate(self, layer):
+        """ Drop the statistics of the layer, so that they are calculated
+        again when they are requested the next time.
+        """
+        if layer not in self.versions:
+            return
+        self.statistics.pop(layer, None)
+        self.versions[layer] = self.versions.get(layer, 0) + 1
+
+
+
+LAYER_STATISTICS = LayerStatisticsCache()
@@ -0,0 +1,103 @@
+"""
+Running operations step by step.
+
+An operation has a run method that calculates its result. Long running
+operations can also have a run_steps generator method, which does the same
+work and yields after each step, and a get_number_of_steps method. Each yield
+is a point at which progress can be reported and at which the operation can
+be cancelled, by not asking for the next step. An OutputPolicy says how
+the result is handed over once it has been calculated.
+"""
+
+import numpy as np
+
+
+def run_steps(operation):
+    """Run the operation, yielding after each of its steps. Operations
+    without a run_steps method are run in one step."""
+    steps = getattr(operation, "run_steps", None)
+    if steps is None:
+        operation.run()
+        yield
+        return
+    yield from steps()
+
+
+def get_number_of_steps(operation):
+    """Answer the number of steps of the operation. Operations without a
+    get_number_of_steps method have one step."""
+    get_steps = getattr(operation, "get_number_of_steps", None)
+    if get_steps is None:
+        return 1
+    return get_steps()
+
+
+
+class OutputPolicy(object):
+    """How the result of an operation is handed over.
+
+    dtype is None to keep the type of the result, or the type into which it
+    is converted, for example float32 for the float64 results of the
+    filters. Integer results are clipped to the range of an integer type,
+    while the range of the values of a float result is stretched to it,
+    so that small responses, like those of the ridge filters, are kept.
+    With replace, an existing output of the same name is updated instead
+    of a new one being added. With release, the operation drops its arrays
+    once the result has been handed over, so that it does not keep the
+    input and the result alive. cache_bytes is the memory that the results
+    of earlier runs may keep in the result cache, on top of the outputs
+    showing them, 0 to not cache the results.
+    """
+
+    def __init__(self, dtype=None, replace=False, release=True,
+                 cache_bytes=2**30):
+        super().__init__()
+        self.dtype = dtype
+        self.replace = replace
+        self.release = release
+        self.cache_bytes = cache_bytes
+
+    def convert(self, result):
+        if self.dtype is None or result.dtype == self.dtype:
+            return result
+        dtype = np.dtype(self.dtype)
+        if dtype.kind not in "ui":
+            return result.astype(dtype)
+        info = np.iinfo(dtype)
+        if result.dtype.kind in "uib":
+            return np.clip(result, info.min, info.max).astype(dtype)
+        return self.stretch(result, info).astype(dtype)
+
+    @staticmethod
+    def stretch(result, info):
+        """Map the range of the finite values of the float result linearly
+        to the range of the integer type."""
+        finite = np.isfinite(result)
+        if not finite.any():
+            return np.zeros(result.shape)
+        low = float(result[finite].min())
+        high = float(result[finite].max())
+        scale = (float(info.max) - info.min) / (high - low) if high > low else 0
+        stretched = np.rint((result - low) * scale + info.min)
+        stretched[~finite] = info.min
+        return np.clip(stretched, info.min, info.max)
+
+    def convert_labels(self, labels):
+        """Convert the labels into dtype if it is an integer type that can
+        hold all of them, since labels are neither fractional nor clipped."""
+        if self.dtype is None or labels.dtype == self.dtype or labels.size == 0:
+            return labels
+        dtype = np.dtype(self.dtype)
+        if dtype.kind not in "ui":
+            return labels
+        info = np.iinfo(dtype)
+        if labels.min() < info.min or labels.max() > info.max:
+            return labels
+        return labels.astype(dtype)
+
+
+def release_arrays(operation):
+    """Drop the references of the operation to its input and result arrays."""
+    for name, value in list(vars(operation).items()):
+        if isinstance(value, np.ndarray):
+            setattr(operation, name, None)
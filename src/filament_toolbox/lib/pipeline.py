@@ -0,0 +1,269 @@
+"""
+Pipelines of operations of the toolbox, run without napari.
+
+A pipeline is a list of steps, written in a json or yaml file like:
+
+    steps:
+      - operation: GaussianFilter
+        sigma: [1, 2, 2]
+      - operation: FrangiFilter
+        sigmas: [1, 2, 3]
+      - operation: Threshold
+        min_value: 0.05
+        output: mask
+      - operation: Label
+      - operation: RemoveSmallObjects
+        max_size: 50
+      - operation: Skeletonize
+        method: lee
+      - operation: MeasureSkeleton
+        output: branches
+
+Each step creates the named operation and sets the other entries as its
+attributes. The input of a step is the result of the previous step, or,
+with an input entry, the named results of earlier steps. The input of the
+pipeline is called image and the result of a step can be named with an
+output entry. The results are handed from step to step without copies and
+unnamed results are released as soon as the next step has been created.
+"""
+
+import importlib
+import json
+import os
+
+from filament_toolbox.lib.operation import run_steps
+from filament_toolbox.lib.table import ResultsTable
+
+
+OPERATIONS = {
+    "AnisotropicDiffusionFilter": "filament_toolbox.lib.filter",
+    "ClearBorder": "filament_toolbox.lib.segmentation",
+    "Closing": "filament_toolbox.lib.morphology",
+    "Dilation": "filament_toolbox.lib.morphology",
+    "Erosion": "filament_toolbox.lib.morphology",
+    "EuclideanDistanceTransform": "filament_toolbox.lib.morphology",
+    "FrangiFilter": "filament_toolbox.lib.filter",
+    "GaussianFilter": "filament_toolbox.lib.filter",
+    "HamiltonJacobiSkeleton": "filament_toolbox.lib.morphology",
+    "IsotropicResampling": "filament_toolbox.lib.transform",
+    "Label": "filament_toolbox.lib.morphology",
+    "LocalThickness": "filament_toolbox.lib.morphology",
+    "MeasureLabels": "filament_toolbox.lib.measure",
+    "MeasureSkeleton": "filament_toolbox.lib.measure",
+    "MedialAxisTransform": "filament_toolbox.lib.morphology",
+    "MedianFilter": "filament_toolbox.lib.filter",
+    "MeijeringFilter": "filament_toolbox.lib.filter",
+    "Opening": "filament_toolbox.lib.morphology",
+    "RemoveSmallObjects": "filament_toolbox.lib.morphology",
+    "RollingBall": "filament_toolbox.lib.filter",
+    "SatoFilter": "filament_toolbox.lib.filter",
+    "Skeletonize": "filament_toolbox.lib.morphology",
+    "SubtractImage": "filament_toolbox.lib.icalc",
+    "Threshold": "filament_toolbox.lib.segmentation",
+}
+
+
+def get_operation_class(name):
+    """Answer the class of the operation with the given name. The module
+    of the operation is only imported when it is used."""
+    if name not in OPERATIONS:
+        raise ValueError(
+            f"Unknown operation {name}, "
+            f"known operations are {', '.join(sorted(OPERATIONS))}."
+        )
+    return getattr(importlib.import_module(OPERATIONS[name]), name)
+
+
+class PipelineStep(object):
+    """An operation of a pipeline, with the attributes to set and the names
+    of its inputs and of its output."""
+
+    def __init__(self, operation, attributes=None, inputs=None, output=None):
+        super().__init__()
+        self.operation = operation
+        self.attributes = dict(attributes or {})
+        self.inputs = inputs        # None for the result of the previous step
+        self.output = output
+
+    @classmethod
+    def from_dict(cls, description):
+        description = dict(description)
+        if "operation" not in description:
+            raise ValueError(f"The step {description} has no operation.")
+        operation = description.pop("operation")
+        inputs = description.pop("input", None)
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        output = description.pop("output", None)
+        return cls(operation, description, inputs, output)
+
+    def to_dict(self):
+        description = {"operation": self.operation}
+        if self.inputs is not None:
+            description["input"] = list(self.inputs)
+        if self.output is not None:
+            description["output"] = self.output
+        description.update(self.attributes)
+        return description
+
+    def create_operation(self, images):
+        """Create the operation on the input images and set its attributes.
+        Attributes the operation does not have are refused, so that a typo
+        in a pipeline file is not silently ignored."""
+        operation = get_operation_class(self.operation)(*images)
+        for name, value in self.attributes.items():
+            if not hasattr(operation, name):
+                raise ValueError(
+                    f"The operation {self.operation} has no attribute {name}."
+                )
+            setattr(operation, name, value)
+        return operation
+
+
+class Pipeline(object):
+    """Run a list of steps on an image, see the module documentation.
+
+    After run, result is the result of the last step, images holds the
+    named results that are images and tables the results of the steps
+    that have a table, like the measurements, by the name of the output
+    or else of the operation. If scale is set, it is given to the
+    operations that have a scale attribute and do not set it themselves.
+    """
+
+    def __init__(self, steps, image=None):
+        super().__init__()
+        self.steps = steps
+        self.image = image
+        self.scale = None
+        self.result = None
+        self.images = {}
+        self.tables = {}
+
+    @classmethod
+    def from_dict(cls, description):
+        return cls([PipelineStep.from_dict(step)
+                    for step in description["steps"]])
+
+    @classmethod
+    def load(cls, path):
+        """Read a pipeline from a json file or, if the path ends with .yaml
+        or .yml, from a yaml file."""
+        with open(path) as file:
+            if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+                import yaml
+                description = yaml.safe_load(file)
+            else:
+                description = json.load(file)
+        return cls.from_dict(description)
+
+    def to_dict(self):
+        return {"steps": [step.to_dict() for step in self.steps]}
+
+    def save(self, path):
+        with open(path, "w") as file:
+            if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+                import yaml
+                yaml.safe_dump(self.to_dict(), file, sort_keys=False)
+            else:
+                json.dump(self.to_dict(), file, indent=4)
+
+    def run(self):
+        for _ in self.run_steps():
+            pass
+
+    def get_number_of_steps(self):
+        return len(self.steps)
+
+    def run_steps(self):
+        """Run the steps one after the other and yield after each of them."""
+        self.images = {"image": self.image}
+        self.tables = {}
+        self.result = None
+        previous = None
+        for step in self.steps:
+            if step.inputs is None:
+                inputs = [self.image if previous is None else previous.result]
+            else:
+                inputs = [self.get_image(name) for name in step.inputs]
+            operation = step.create_operation(inputs)
+            previous = None
+            if (self.scale is not None and hasattr(operation, "scale")
+                    and "scale" not in step.attributes):
+                operation.scale = self.scale
+            for _ in run_steps(operation):
+                pass
+            table = getattr(operation, "table", None)
+            if table is not None:
+                self.tables[step.output or step.operation] = table
+            elif step.output is not None:
+                self.images[step.output] = operation.result
+            previous = operation
+            yield
+        if previous is not None and getattr(previous, "table", None) is None:
+            self.result = previous.result
+
+    def get_image(self, name):
+        if name not in self.images:
+            raise ValueError(
+                f"There is no image {name}, the named images are "
+                f"{', '.join(self.images)}."
+            )
+        return self.images[name]
+
+    def get_outputs(self):
+        """Answer the named images, without the input image, and the result
+        of the last step, by the names under which they are saved."""
+        outputs = {
+            name: image for name, image in self.images.items()
+            if name != "image"
+        }
+        if self.result is not None and not any(
+            image is self.result for image in outputs.values()
+        ):
+            outputs["result"] = self.result
+        return outputs
+
+    def save_results(self, folder, name, image_format="tif", table_format="csv"):
+        """Write the outputs as tif or zarr images and the tables as csv or
+        parquet files into the folder, with the given name and the name of
+        the output. Answer the paths of the written files."""
+        os.makedirs(folder, exist_ok=True)
+        paths = []
+        for output, image in self.get_outputs().items():
+            path = os.path.join(folder, f"{name}_{output}.{image_format}")
+            write_image(image, path)
+            paths.append(path)
+        for output, table in self.tables.items():
+            path = os.path.join(folder, f"{name}_{output}.{table_format}")
+            ResultsTable(table).save(path)
+            paths.append(path)
+        return paths
+
+
+def read_image(path):
+    """Read an image from a file or, if the path ends with .zarr, from a
+    zarr array, which needs zarr."""
+    if os.path.normpath(str(path)).lower().endswith(".zarr"):
+        import zarr
+
+        return zarr.open_array(path, mode="r")[...]
+    from skimage.io import imread
+
+    return imread(path)
+
+
+def write_image(image, path):
+    """Write the image to a tif file or, if the path ends with .zarr, to a
+    zarr array, which needs zarr. The zarr array is chunked in planes."""
+    if str(path).lower().endswith(".zarr"):
+        import zarr
+
+        chunks = (1,) * (image.ndim - 2) + tuple(image.shape[-2:])
+        array = zarr.open_array(
+            path, mode="w", shape=image.shape, dtype=image.dtype, chunks=chunks
+        )
+        array[...] = image
+        return
+    from skimage.io import imsave
+
+    imsave(path, image, check_contrast=False)
@@ -1,13 +1,13 @@
 from typing import TYPE_CHECKING
 import pyperclip
 import numpy as np
-import matplotlib.pyplot as plt
-from qtpy.QtCore import Qt
+from qtpy.QtCore import Qt, QAbstractTableModel, QModelIndex
+from qtpy.QtGui import QColor, QPainter
 from qtpy.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout
-from qtpy.QtWidgets import QLabel, QLineEdit, QComboBox, QTableWidget, QTableWidgetItem, QAction
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from qtpy.QtWidgets import QLabel, QLineEdit, QComboBox, QTableView, QAction, QFileDialog
 from napari.utils import notifications
 from filament_toolbox.lib.array_util import ArrayUtil
+from filament_toolbox.lib.table import ResultsTable
 if TYPE_CHECKING:
     import napari
 
@@ -79,28 +79,82 @@ class WidgetTool:
 
 
 
-class TableView(QTableWidget):
-    """ A table that allows to copy the selected cells to the system-clipboard.
+class TableModel(QAbstractTableModel):
+    """ A model that answers the cells of a results table on demand, so that
+    the view only converts the values of the visible cells to text.
+    """
+
+    def __init__(self, table, parent=None):
+        super().__init__(parent)
+        self.table = ResultsTable(table)
+
+
+    def setTable(self, table):
+        self.beginResetModel()
+        self.table = ResultsTable(table)
+        self.endResetModel()
+
+
+    def rowCount(self, parent=None):
+        if parent is None:
+            parent = QModelIndex()
+        if parent.isValid():
+            return 0
+        return self.table.getRowCount()
+
+
+    def columnCount(self, parent=None):
+        if parent is None:
+            parent = QModelIndex()
+        if parent.isValid():
+            return 0
+        return len(self.table)
+
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return str(self.table.getValue(index.row(), index.column()))
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.table.getColumnNames()[section]
+        return str(section + 1)
+
+
+
+class TableView(QTableView):
+    """ A table that allows to copy the selected cells to the system-clipboard
+    and to save the table as a csv or parquet file. The cells are provided by
+    a TableModel, so that large tables are displayed without creating an
+    item for each cell.
     """
 
     def __init__(self, data, *args):
         """Create a new table from data.
 
-        :param data: A dictionary with the column names as keys and the data
-        in the columns as lists.
+        :param data: A ResultsTable or a dictionary with the column names as
+        keys and the data in the columns as lists or arrays.
         """
-        rows = 0
-        columns = 0
-        if data:
-            columns = len(data)
-            rows = len(list(data.values())[0])
-        QTableWidget.__init__(self, rows, columns, *args)
-        self.data = data
-        self.__setData()
+        QTableView.__init__(self, *args)
+        self.tableModel = TableModel(data, self)
+        self.data = self.tableModel.table
+        self.setModel(self.tableModel)
+        self.resizeColumnsToContents()
         self.setContextMenuPolicy(Qt.ActionsContextMenu)
         copyAction = QAction("Copy\tCtrl+C", self)
         copyAction.triggered.connect(self.copyDataToClipboard)
         self.addAction(copyAction)
+        saveAction = QAction("Save...", self)
+        saveAction.triggered.connect(self.saveTable)
+        self.addAction(saveAction)
         self.resetAction = QAction("Reset", self)
         self.addAction(self.resetAction)
         self.deleteAction = QAction("Delete", self)
@@ -108,27 +162,27 @@ class TableView(QTableWidget):
 
 
     def setData(self, table):
-        self.clear()
-        self.data = table
-        self.__setData()
+        self.tableModel.setTable(table)
+        self.data = self.tableModel.table
+        self.resizeColumnsToContents()
 
 
     def resetView(self):
-        self.clear()
-        self.__setData()
-
-
-    def __setData(self):
-        horHeaders = []
-        for n, key in enumerate(self.data.keys()):
-            horHeaders.append(key)
-            for m, item in enumerate(self.data[key]):
-                newItem = QTableWidgetItem(str(item))
-                newItem.setTextAlignment(Qt.AlignRight)
-                self.setItem(m, n, newItem)
-        self.setHorizontalHeaderLabels(horHeaders)
+        self.tableModel.setTable(self.data)
         self.resizeColumnsToContents()
-        self.resizeRowsToContents()
+
+
+    def saveTable(self):
+        """ Ask for a file and save the table to it, as a parquet file if the
+        name ends with .parquet and as a csv file otherwise.
+        """
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Save table", "", "CSV (*.csv);;Parquet (*.parquet)"
+        )
+        if not path:
+            return
+        self.data.save(path)
+        notifications.show_info("table saved to " + path)
 
 
     def keyPressEvent(self, event):
@@ -157,10 +211,12 @@ class TableView(QTableWidget):
         copied_cells = self.selectedIndexes()
         if len(copied_cells) == 0:
             return ""
-        labels = [self.horizontalHeaderItem(id).text() for id in range(0, self.columnCount())]
-        data = [['' for i in range(self.columnCount())] for j in range(self.rowCount())]
+        labels = self.data.getColumnNames()
+        firstRow = min(cell.row() for cell in copied_cells)
+        lastRow = max(cell.row() for cell in copied_cells)
+        data = [['' for i in range(len(labels))] for j in range(lastRow - firstRow + 1)]
         for cell in copied_cells:
-            data[cell.row()][cell.column()] = cell.data()
+            data[cell.row() - firstRow][cell.column()] = cell.data()
         table =  np.array(data)
         table, columnIndices, _ = ArrayUtil.stripZeroRowsAndColumns(table, zero='')
         lines = ''
@@ -173,11 +229,67 @@ class TableView(QTableWidget):
 
 
 
+class HistogramView(QWidget):
+    """ A small view of a histogram, with logarithmic counts, in which the
+    bins between a lower and an upper threshold are highlighted.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.counts = None
+        self.edges = None
+        self.lower = None
+        self.upper = None
+        self.setMinimumHeight(80)
+
+
+    def setHistogram(self, counts, edges):
+        """Set the counts of the histogram and the edges of its bins.
+        """
+        self.counts = np.log1p(np.asarray(counts, dtype=np.float64))
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.update()
+
+
+    def setThresholds(self, lower, upper):
+        self.lower = lower
+        self.upper = upper
+        self.update()
+
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(38, 41, 48))
+        if self.counts is None or len(self.counts) == 0:
+            painter.end()
+            return
+        width = self.width()
+        height = self.height()
+        starts = np.linspace(0, len(self.counts), width + 1)[:-1].astype(int)
+        heights = np.maximum.reduceat(self.counts, starts)
+        heights = heights / (heights.max() or 1) * (height - 1)
+        centers = np.linspace(self.edges[0], self.edges[-1], width)
+        inside = np.ones(width, bool)
+        if self.lower is not None:
+            inside &= centers >= self.lower
+        if self.upper is not None:
+            inside &= centers <= self.upper
+        colors = (QColor(128, 128, 128), QColor(255, 140, 0))
+        for x in range(width):
+            painter.setPen(colors[int(inside[x])])
+            painter.drawLine(x, height, x, height - int(heights[x]))
+        painter.end()
+
+
+
 class PlotWidget(QWidget):
 
 
     def __init__(self, viewer: "napari.viewer.Viewer"):
         super().__init__()
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+
         self.figure = plt.figure()
         self.ax = self.figure.add_subplot(111)
         self.canvas = FigureCanvas(self.figure)
@@ -1,6 +1,8 @@
 import numpy as np
 from skimage.segmentation import clear_border
 
+from filament_toolbox.lib.array_util import ArrayUtil
+
 
 class Segmentation(object):
 
@@ -13,22 +15,88 @@ class Segmentation(object):
         
         
 class Threshold(Segmentation):
+    """Create a mask of the voxels with values between min_value and
+    max_value. Without min_value the mask is empty.
+
+    The image is compared slab by slab along the first axis, with the
+    comparisons written directly into the result, so that no index arrays
+    or temporary full-size masks are created. The result is a uint8 mask
+    with the value 255 for the foreground, or a bool mask, or, if
+    bit_packed is set, the bool mask packed into bits along the last axis
+    (see unpack).
+    """
     
     
     def __init__(self, image):
         super().__init__(image)
         self.min_value = 128
         self.max_value = None
+        self.dtype = np.uint8           # np.uint8 (0 and 255) or bool
+        self.bit_packed = False
+        self.output = None              # optional preallocated (or zarr) array for the result
+        self.chunk_voxels = 2**22
 
 
     def run(self):
-        self.result = np.zeros(self.image.shape, dtype=np.uint8)
-        if not self.min_value is None:
-            indices = np.where(self.image >= self.min_value)
-            self.result[indices] = 255
-        if not self.max_value is None:
-            indices = np.where(self.image > self.max_value)
-            self.result[indices] = 0
+        for _ in self.run_steps():
+            pass
+
+
+    def get_number_of_steps(self):
+        return len(ArrayUtil.getSlabs(self.image.shape, self.chunk_voxels))
+
+
+    def run_steps(self):
+        """Threshold one slab per step."""
+        self.result = self.output
+        if self.result is None:
+            self.result = np.empty(self.get_result_shape(), dtype=self.get_result_dtype())
+        mask = None
+        for chunk in ArrayUtil.getSlabs(self.image.shape, self.chunk_voxels):
+            block = np.asarray(self.image[chunk])
+            if mask is None or mask.shape != block.shape:
+                mask = np.empty(block.shape, dtype=bool)
+            self.calculate_mask(block, mask)
+            self.write_mask(chunk, mask)
+            yield
+
+
+    def calculate_mask(self, block, mask):
+        if self.min_value is None:
+            mask.fill(False)
+        else:
+            np.greater_equal(block, self.min_value, out=mask)
+        if self.max_value is not None:
+            mask &= block <= self.max_value
+
+
+    def write_mask(self, chunk, mask):
+        if self.bit_packed:
+            self.result[chunk[:-1]] = np.packbits(mask, axis=-1)
+        elif np.dtype(self.get_result_dtype()) == np.bool_:
+            self.result[chunk] = mask
+        else:
+            self.result[chunk] = mask.view(np.uint8) * np.uint8(255)
+
+
+    def get_result_shape(self):
+        shape = self.image.shape
+        if self.bit_packed:
+            return tuple(shape[:-1]) + ((shape[-1] + 7) // 8,)
+        return tuple(shape)
+
+
+    def get_result_dtype(self):
+        if self.bit_packed:
+            return np.uint8
+        return np.dtype(self.dtype)
+
+
+    @staticmethod
+    def unpack(packed, shape):
+        """Answer the bool mask of the given shape from a bit-packed
+        result."""
+        return np.unpackbits(packed, axis=-1, count=shape[-1]).astype(bool)
 
 
 
@@ -2,7 +2,6 @@ import os
 import numpy as np
 from skimage.draw import line_nd
 from skimage.measure import label
-from skan import Skeleton
 
 
 class Node(object):
@@ -34,6 +33,8 @@ class SWCForest(object):
 
 
     def get_skeleton(self):
+        from skan import Skeleton
+
         mask = np.zeros(self.get_shape())
         for data in self.data:
             indices = line_nd(data[0], data[1], integer=True)
@@ -0,0 +1,60 @@
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+from scipy.ndimage import gaussian_filter
+from skimage.draw import line_nd
+
+
+class SyntheticFilaments(object):
+    """Create an image of random, curved filaments with blur and noise,
+    together with the ground truth mask of the filaments.
+
+    The filaments are random walks with a slowly changing direction. The
+    same seed always gives the same image, so that the data can be used for
+    benchmarks and tests.
+    """
+
+    def __init__(self, shape=(32, 128, 128)):
+        super().__init__()
+        self.shape = shape
+        self.n_filaments = 12
+        self.n_segments = 20
+        self.segment_length = 8
+        self.curvature = 0.4
+        self.radius = 1.5
+        self.sigma = 1
+        self.background = 20
+        self.foreground = 180
+        self.noise = 15
+        self.seed = 0
+        self.result = None
+        self.labels = None
+
+    def run(self):
+        rng = np.random.default_rng(self.seed)
+        shape = np.array(self.shape)
+        skeleton = np.zeros(self.shape, bool)
+        for _ in range(self.n_filaments):
+            position = rng.random(len(shape)) * (shape - 1)
+            direction = self.random_direction(rng, len(shape))
+            for _ in range(self.n_segments):
+                direction = direction + self.curvature * self.random_direction(
+                    rng, len(shape)
+                )
+                direction = direction / np.linalg.norm(direction)
+                end = np.clip(
+                    position + self.segment_length * direction, 0, shape - 1
+                )
+                skeleton[line_nd(position, end, endpoint=True, integer=True)] = True
+                position = end
+        distances = distance_transform_edt(~skeleton)
+        self.labels = (distances <= self.radius).astype(np.uint8)
+        image = self.background + (
+            self.foreground - self.background
+        ) * gaussian_filter(self.labels.astype(np.float32), self.sigma)
+        image = image + rng.normal(0, self.noise, self.shape)
+        self.result = np.clip(image, 0, 255).astype(np.uint8)
+
+    @staticmethod
+    def random_direction(rng, ndim):
+        direction = rng.normal(size=ndim)
+        return direction / np.linalg.norm(direction)
@@ -0,0 +1,55 @@
+from collections.abc import Mapping
+
+import pandas as pd
+
+
+class ResultsTable(Mapping):
+    """A table of results, stored column by column in a pandas DataFrame.
+
+    The table can be read like the dictionaries of columns returned by
+    regionprops_table, with the column names as keys and the columns as
+    numpy arrays. Columns of different lengths are padded with NaN. It can
+    be saved in one go as a csv file or as a parquet file, which needs
+    pyarrow.
+    """
+
+    def __init__(self, columns=None):
+        super().__init__()
+        if isinstance(columns, ResultsTable):
+            columns = columns.dataFrame
+        if columns is None:
+            columns = {}
+        if isinstance(columns, Mapping):
+            columns = {
+                name: pd.Series(column) for name, column in columns.items()
+            }
+        self.dataFrame = pd.DataFrame(columns)
+
+    def __getitem__(self, key):
+        return self.dataFrame[key].to_numpy()
+
+    def __iter__(self):
+        return iter(self.dataFrame.columns)
+
+    def __len__(self):
+        return len(self.dataFrame.columns)
+
+    def __repr__(self):
+        return repr(self.dataFrame)
+
+    def getRowCount(self):
+        return len(self.dataFrame)
+
+    def getColumnNames(self):
+        return [str(name) for name in self.dataFrame.columns]
+
+    def getValue(self, row, column):
+        return self.dataFrame.iat[row, column]
+
+    def save(self, path):
+        """Write the table to a csv file or, if the path ends with .parquet,
+        to a parquet file."""
+        if str(path).lower().endswith(".parquet"):
+            self.dataFrame.to_parquet(path)
+        else:
+            self.dataFrame.to_csv(path, index=False)
@@ -1,6 +1,4 @@
 import numpy as np
-from brightest_path_lib.algorithm import AStarSearch
-from brightest_path_lib.algorithm import NBAStarSearch
 
 
 class BrightestPathTracing(object):
@@ -10,12 +8,14 @@ class BrightestPathTracing(object):
         self.image = image
         self.points = points
         self.method = "NBA-star"
-        self.methods = {"A-star": AStarSearch, "NBA-star": NBAStarSearch}
+        self.methods = {"A-star": "AStarSearch", "NBA-star": "NBAStarSearch"}
         self.result = None
 
     def run(self):
         self.result = np.zeros(self.image.shape, np.uint16)
-        method = self.methods[self.method]
+        import brightest_path_lib.algorithm
+
+        method = getattr(brightest_path_lib.algorithm, self.methods[self.method])
         for index in range(len(self.points) - 1):
             start = self.points[index]
             end = self.points[index + 1]
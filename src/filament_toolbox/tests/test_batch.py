@@ -0,0 +1,117 @@
+import os
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+from skimage.io import imsave
+
+from filament_toolbox.lib.batch import BatchPipeline
+from filament_toolbox.lib.batch import BatchPixelClassification
+from filament_toolbox.lib.batch import get_size
+from filament_toolbox.lib.ml import PixelClassifier
+from filament_toolbox.lib.pipeline import Pipeline
+
+
+def test_batch_pipeline_skips_the_images_that_are_done(tmp_path):
+    rng = np.random.default_rng(0)
+    paths = []
+    for index in range(3):
+        path = str(tmp_path / f"image{index}.tif")
+        imsave(path, rng.integers(0, 255, (20, 30), dtype=np.uint8))
+        paths.append(path)
+    pipeline = Pipeline.from_dict(
+        {"steps": [{"operation": "Threshold", "min_value": 128}]}
+    )
+    output = str(tmp_path / "output")
+    batch = BatchPipeline(pipeline, paths, output)
+    batch.n_workers = 2
+    batch.run()
+    assert len(batch.result) == 3
+    os.remove(os.path.join(output, "image1_result.tif"))
+    batch.run()
+    assert batch.result == [paths[1]]
+    assert batch.manifest["runs"][-1]["skipped"] == 2
+    batch.scale = (2, 1, 1)
+    batch.run()
+    assert len(batch.result) == 3
+
+
+def test_batch_pipeline_refuses_images_with_the_same_name(tmp_path):
+    paths = []
+    for folder in ("a", "b"):
+        (tmp_path / folder).mkdir()
+        path = str(tmp_path / folder / "image.tif")
+        imsave(path, np.zeros((5, 6), dtype=np.uint8), check_contrast=False)
+        paths.append(path)
+    pipeline = Pipeline.from_dict({"steps": [{"operation": "Label"}]})
+    batch = BatchPipeline(pipeline, paths, str(tmp_path / "output"))
+    with pytest.raises(ValueError):
+        batch.run()
+
+
+def test_batch_pixel_classification_records_images_that_fail(tmp_path):
+    image = np.zeros((20, 30), dtype=np.uint8)
+    image[:, 15:] = 200
+    classifier = PixelClassifier(image)
+    classifier.sigma_max = 2
+    classifier.training_labels_image = np.zeros(image.shape, np.uint8)
+    classifier.training_labels_image[10, 5] = 1
+    classifier.training_labels_image[10, 25] = 2
+    classifier.train()
+    model_path = str(tmp_path / "model.joblib")
+    classifier.save(model_path)
+    image_path = str(tmp_path / "image.tif")
+    imsave(image_path, image)
+    broken_path = str(tmp_path / "broken.tif")
+    with open(broken_path, "w") as file:
+        file.write("not an image")
+    batch = BatchPixelClassification(
+        model_path, [broken_path, image_path], str(tmp_path / "output")
+    )
+    batch.n_workers = 2
+    batch.run()
+    assert batch.result == [batch.get_output_path(image_path)]
+    assert list(batch.errors) == [broken_path]
+
+
+def create_future(result=None, error=None):
+    future = Future()
+    if error is None:
+        future.set_result(result)
+    else:
+        future.set_exception(error)
+    return future
+
+
+def test_batch_pipeline_fails_only_the_job_that_broke_the_pool(tmp_path):
+    pipeline = Pipeline.from_dict({"steps": [{"operation": "Label"}]})
+    batch = BatchPipeline(pipeline, [], str(tmp_path))
+    batch.manifest = {"images": {}}
+    batch.result = []
+    running = {
+        create_future(([], 1.0)): "a.tif",
+        create_future(error=BrokenProcessPool()): "b.tif",
+        create_future(error=BrokenProcessPool()): "c.tif",
+    }
+    suspects = deque()
+    batch.recover(running, suspects)
+    assert batch.result == ["a.tif"]
+    assert list(suspects) == ["b.tif", "c.tif"]
+    assert not running
+    running = {create_future(error=BrokenProcessPool()): suspects.popleft()}
+    batch.recover(running, suspects)
+    statuses = {
+        os.path.basename(path): entry["status"]
+        for path, entry in batch.manifest["images"].items()
+    }
+    assert statuses == {"a.tif": "done", "b.tif": "failed"}
+
+
+def test_size_of_a_zarr_folder_is_the_size_of_its_chunks(tmp_path):
+    chunks = tmp_path / "image.zarr" / "0"
+    chunks.mkdir(parents=True)
+    (chunks / "0").write_bytes(b"0" * 300)
+    (chunks / "1").write_bytes(b"0" * 200)
+    assert get_size(str(tmp_path / "image.zarr")) == 500
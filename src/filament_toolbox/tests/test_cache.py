@@ -0,0 +1,88 @@
+import numpy as np
+
+from filament_toolbox.lib.cache import ArrayCache
+from filament_toolbox.lib.cache import ResultCache
+from filament_toolbox.lib.cache import array_hash
+from filament_toolbox.lib.filter import GaussianFilter
+
+
+def test_array_hash_depends_on_content_and_type():
+    image = np.arange(24, dtype=np.uint8).reshape(2, 3, 4)
+    assert array_hash(image) == array_hash(image.copy())
+    assert array_hash(image) != array_hash(image.astype(np.uint16))
+    assert array_hash(image) != array_hash(image[::-1])
+
+
+def test_array_cache_evicts_least_recently_used():
+    cache = ArrayCache(max_bytes=100)
+    cache.put("a", np.zeros(40, np.uint8))
+    cache.put("b", np.zeros(40, np.uint8))
+    cache.get("a")
+    cache.put("c", np.zeros(40, np.uint8))
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.n_bytes == 80
+    cache.set_max_bytes(50)
+    assert list(cache.entries) == ["c"]
+
+
+def test_result_cache_returns_results_of_same_inputs_and_parameters(tmp_path):
+    image = np.random.default_rng(0).random((20, 30))
+    cache = ResultCache(folder=str(tmp_path), min_disk_seconds=0)
+    operation = GaussianFilter(image)
+    list(cache.run_steps(operation))
+    first = operation.result
+    operation = GaussianFilter(image.copy())
+    list(cache.run_steps(operation))
+    assert operation.result is first
+    operation.sigma = (2, 2, 2)
+    list(cache.run_steps(operation))
+    assert operation.result is not first
+    operation = GaussianFilter(image)
+    list(ResultCache(folder=str(tmp_path)).run_steps(operation))
+    assert np.array_equal(operation.result, first)
+
+
+class FakeLazyArray(object):
+    def __init__(self, array):
+        self.array = array
+        self.shape = array.shape
+        self.dtype = array.dtype
+        self.ndim = array.ndim
+
+    def __array__(self, dtype=None, copy=None):
+        return self.array
+
+
+def test_result_cache_runs_operations_on_lazy_arrays_without_caching():
+    cache = ResultCache()
+    operation = GaussianFilter(FakeLazyArray(np.zeros((10, 10))))
+    assert cache.get_key(operation) is None
+    list(cache.run_steps(operation))
+    operation = GaussianFilter(FakeLazyArray(np.ones((10, 10))))
+    list(cache.run_steps(operation))
+    assert np.all(operation.result > 0)
+    assert not cache.entries
+
+
+def test_result_cache_hashes_read_only_views_of_changing_arrays_again():
+    cache = ResultCache()
+    image = np.zeros((10, 10))
+    view = image.view()
+    view.flags.writeable = False
+    first = cache.get_hash(view)
+    image[0, 0] = 1
+    assert cache.get_hash(view) != first
+
+
+def test_result_cache_does_not_hash_big_inputs():
+    cache = ResultCache(max_hash_bytes=100)
+    operation = GaussianFilter(np.zeros((10, 10)))
+    assert cache.get_key(operation) is None
+    list(cache.run_steps(operation))
+    assert not cache.entries
+    operation = GaussianFilter(np.zeros((3, 3)))
+    list(cache.run_steps(operation))
+    assert not operation.result.flags.writeable
+    cache.max_hash_bytes = 50
+    assert cache.get_key(GaussianFilter(np.zeros((3, 3)))) is None
+    assert cache.get_key(GaussianFilter(operation.result)) is not None
@@ -0,0 +1,22 @@
+import numpy as np
+from skimage.filters import threshold_li
+from skimage.filters import threshold_otsu
+from skimage.filters import threshold_triangle
+
+from filament_toolbox.lib.histogram import ImageStatistics
+
+
+def test_thresholds_from_histogram_equal_skimage_for_integer_images():
+    rng = np.random.default_rng(0)
+    image = np.concatenate(
+        [rng.normal(40, 8, 3000), rng.normal(150, 20, 1000)]
+    ).clip(0, 255).astype(np.uint8).reshape(40, 100)
+    statistics = ImageStatistics(image)
+    statistics.chunk_voxels = 300
+    statistics.run()
+    assert statistics.min == image.min()
+    assert statistics.max == image.max()
+    assert statistics.get_percentile(50) == np.percentile(image, 50)
+    assert statistics.get_threshold("otsu") == threshold_otsu(image)
+    assert np.isclose(statistics.get_threshold("li"), threshold_li(image))
+    assert statistics.get_threshold("triangle") == threshold_triangle(image)
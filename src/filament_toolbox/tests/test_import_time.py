@@ -0,0 +1,32 @@
+import subprocess
+import sys
+
+HEAVY_MODULES = (
+    "napari", "qtpy", "skimage", "sklearn", "skan", "kimimaro", "cv2",
+    "pyhjs", "medpy", "matplotlib", "brightest_path_lib", "localthickness",
+    "numba", "pandas",
+)
+
+
+def get_import_times(statement):
+    """Answer the cumulative import times in microseconds, by module, that
+    python -X importtime reports for the statement."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_reader_is_imported_without_the_heavy_libraries():
+    times = get_import_times("import filament_toolbox._reader")
+    heavy = [name for name in times if name.split(".")[0] in HEAVY_MODULES]
+    assert heavy == []
+    assert times["filament_toolbox._reader"] < 500_000
@@ -0,0 +1,67 @@
+import numpy as np
+from skan import Skeleton
+from skan import summarize
+from skimage.measure import regionprops_table
+
+from filament_toolbox.lib.measure import MeasureLabels
+from filament_toolbox.lib.measure import MeasureSkeleton
+
+
+def test_measure_labels_equals_regionprops():
+    labels = np.zeros((6, 8, 10), np.uint16)
+    labels[1:3, 1:4, 2:7] = 3
+    labels[2:6, 5:8, 1:3] = 9
+    labels[4, 0, 9] = 12
+    properties = {"label", "area", "bbox", "centroid", "extent",
+                  "axis_major_length"}
+    measure = MeasureLabels(labels, scale=(2, 1, 0.5))
+    measure.selectedProperties = properties
+    measure.chunkVoxels = 100
+    measure.nWorkers = 1
+    measure.run()
+    expected = regionprops_table(
+        labels, properties=sorted(properties), spacing=(2, 1, 0.5)
+    )
+    assert set(measure.table.keys()) == set(expected.keys())
+    for key, values in expected.items():
+        np.testing.assert_allclose(measure.table[key], values)
+
+
+def test_measure_intensity_statistics_in_chunks():
+    labels = np.zeros((5, 7), np.uint8)
+    labels[0:4, 1:3] = 1
+    labels[2:5, 4:7] = 2
+    image = np.arange(35, dtype=np.uint16).reshape(5, 7) ** 2
+    properties = {"label", "intensity_mean", "intensity_std",
+                  "intensity_min", "intensity_max"}
+    measure = MeasureLabels(labels, image, scale=(1, 1))
+    measure.selectedProperties = properties
+    measure.chunkVoxels = 7
+    measure.run()
+    expected = regionprops_table(labels, image, properties=sorted(properties))
+    for key, values in expected.items():
+        np.testing.assert_allclose(measure.table[key], values)
+
+
+def test_measure_skeleton_by_components():
+    skeleton = np.zeros((12, 16), bool)
+    skeleton[2, 1:10] = True
+    skeleton[2:8, 5] = True
+    skeleton[10, 3:14] = True
+    skeleton[0, 15] = True
+    measure = MeasureSkeleton(skeleton)
+    measure.scale = [2, 1]
+    measure.nWorkers = 1
+    measure.run()
+    expected = summarize(
+        Skeleton(skeleton, spacing=[2, 1]), separator="_",
+        find_main_branch=True,
+    )
+    assert sorted(measure.table["branch_distance"]) == sorted(
+        expected["branch_distance"]
+    )
+    assert sorted(measure.table["coord_src_0"]) == sorted(
+        expected["coord_src_0"]
+    )
+    assert set(measure.table["skeleton_id"]) == {0, 1}
+    assert np.count_nonzero(measure.result) == np.count_nonzero(skeleton) - 1
@@ -0,0 +1,56 @@
+import numpy as np
+
+from filament_toolbox.lib.metric import CenterlineDice
+from filament_toolbox.lib.metric import Dice
+from filament_toolbox.lib.metric import InstanceF1
+from filament_toolbox.lib.metric import MetricsEvaluation
+
+
+def test_dice_of_different_shapes():
+    labels1 = np.zeros((4, 6), np.uint16)
+    labels1[1:3, 1:5] = 7
+    labels2 = np.zeros((5, 5), np.uint8)
+    labels2[1:3, 3:5] = 1
+    dice = Dice(labels1, labels2)
+    dice.chunk_voxels = 5
+    dice.calculate()
+    assert dice.result == (2 * 4) / (8 + 4)
+
+
+def test_centerline_dice_of_identical_masks():
+    labels = np.zeros((9, 9), np.uint8)
+    labels[3:6, 1:8] = 1
+    metric = CenterlineDice(labels, labels)
+    metric.calculate()
+    assert metric.result == 1
+
+
+def test_instance_f1_counts_matched_objects():
+    labels1 = np.zeros((6, 10), np.uint8)
+    labels1[1:3, 1:4] = 1
+    labels1[1:3, 6:9] = 2
+    labels2 = np.zeros((6, 10), np.uint8)
+    labels2[1:3, 1:4] = 5
+    labels2[4:6, 6:9] = 3
+    metric = InstanceF1(labels1, labels2)
+    metric.calculate()
+    assert metric.true_positives == 1
+    assert metric.false_positives == 1
+    assert metric.false_negatives == 1
+    assert metric.result == 0.5
+
+
+def test_metrics_evaluation_keeps_counts_and_object_tables():
+    labels1 = np.zeros((6, 10), np.uint8)
+    labels1[1:3, 1:4] = 1
+    labels1[1:3, 6:9] = 2
+    labels2 = labels1.copy()
+    labels2[labels2 == 2] = 0
+    evaluation = MetricsEvaluation(labels1, labels2, ["F1", "instance clDice"])
+    evaluation.run()
+    assert evaluation.result["F1 TP"] == 1
+    assert evaluation.result["F1 FN"] == 1
+    assert evaluation.result["F1 precision"] == 1
+    assert evaluation.result["F1 recall"] == 0.5
+    assert list(evaluation.tables) == ["instance clDice"]
+    assert evaluation.tables["instance clDice"]["clDice"].tolist() == [1, 0]
@@ -0,0 +1,143 @@
+import numpy as np
+
+from filament_toolbox.lib.ml import FeatureQuantizer
+from filament_toolbox.lib.ml import PixelClassifier
+from filament_toolbox.lib.ml import PixelClassifierBenchmark
+from filament_toolbox.lib.synthetic import SyntheticFilaments
+
+
+def create_classifier(shape=(12, 40, 40), seed=0):
+    image = np.random.default_rng(seed).random(shape).astype(np.float32)
+    classifier = PixelClassifier(image)
+    classifier.sigma_max = 2
+    classifier.tile_size = 8
+    return classifier
+
+
+def test_training_features_equal_features_of_whole_image():
+    classifier = create_classifier()
+    classifier.features_func = classifier.create_features_func()
+    full_features = classifier.features_func(classifier.image)
+    for points in ([[1, 2, 3], [2, 4, 4], [10, 35, 30]],
+                   [[z, y, x] for z in (0, 11) for y in (0, 39) for x in (0, 39)]):
+        classifier.training_labels = np.zeros(classifier.image.shape, np.uint8)
+        coordinates = np.array(points)
+        classifier.training_labels[tuple(coordinates.T)] = 1
+        features = classifier.calculate_training_features(coordinates)
+        assert np.array_equal(features, full_features[tuple(coordinates.T)])
+
+
+def train_classifier(classifier, n_points=100, seed=1):
+    rng = np.random.default_rng(seed)
+    shape = classifier.get_spatial_shape()
+    points = np.stack([rng.integers(0, size, n_points) for size in shape], axis=-1)
+    classifier.training_labels_image = np.zeros(shape, np.uint8)
+    classifier.training_labels_image[tuple(points.T)] = rng.integers(1, 3, n_points)
+    classifier.train()
+
+
+def test_tiled_prediction_equals_prediction_of_whole_image():
+    classifier = create_classifier(shape=(12, 120, 120))
+    train_classifier(classifier)
+    classifier.predict()
+    expected = classifier.result
+    classifier.max_memory = 2**23
+    classifier.n_workers = 2
+    classifier.prediction_tile_size = 16
+    tile_shape = classifier.get_prediction_tile_shape()
+    assert tile_shape == (40, 40, 40)
+    assert classifier.get_number_of_prediction_workers(tile_shape, 9) == 2
+    classifier.predict()
+    assert np.array_equal(classifier.result, expected)
+    assert classifier.classifier.n_jobs == -1
+
+
+def test_prediction_keeps_labels_above_255():
+    classifier = create_classifier(shape=(20, 30))
+    classifier.image[:, 15:] += 2
+    classifier.training_labels_image = np.zeros((20, 30), np.uint16)
+    classifier.training_labels_image[10, 5] = 1
+    classifier.training_labels_image[10, 25] = 300
+    classifier.train()
+    classifier.predict()
+    assert classifier.result.dtype == np.uint16
+    assert set(np.unique(classifier.result)) == {1, 300}
+
+
+def test_incremental_training_grows_the_forest_of_the_same_parameters():
+    classifier = create_classifier(shape=(20, 30))
+    classifier.incremental = True
+    classifier.n_estimators = 5
+    classifier.n_new_estimators = 3
+    classifier.training_labels_image = np.zeros((20, 30), np.uint8)
+    classifier.training_labels_image[5, 5] = 1
+    classifier.training_labels_image[5, 25] = 2
+    classifier.train()
+    classifier.training_labels_image[15, 25] = 2
+    classifier.train()
+    assert len(classifier.classifier.estimators_) == 8
+    classifier.backend = "hist gradient boosting"
+    classifier.max_depth = 3
+    classifier.train()
+    assert classifier.classifier.get_params()["max_depth"] == 3
+    assert classifier.classifier.get_params()["max_iter"] == 5
+
+
+def test_probabilities_are_quantized_and_agree_with_the_labels():
+    classifier = create_classifier(shape=(20, 30))
+    train_classifier(classifier, n_points=40)
+    classifier.calculate_probabilities = True
+    classifier.predict()
+    probabilities = classifier.probabilities
+    assert probabilities.dtype == np.uint8
+    assert probabilities.shape == (2, 20, 30)
+    assert np.all(np.abs(probabilities.sum(axis=0, dtype=int) - 255) <= 1)
+    labels = classifier.classifier.classes_[np.argmax(probabilities, axis=0)]
+    assert np.mean(labels == classifier.result) > 0.95
+
+
+def test_feature_quantizer_clips_to_the_training_range():
+    features = np.array([[0.0, 10.0], [1.0, 20.0]], dtype=np.float32)
+    quantizer = FeatureQuantizer().fit(features)
+    quantized = quantizer.transform(np.array([[0.5, 30.0], [-1.0, 10.0]],
+                                             dtype=np.float32))
+    assert quantized.tolist() == [[128, 255], [0, 0]]
+
+
+def test_saved_classifier_predicts_like_the_trained_one(tmp_path):
+    classifier = create_classifier(shape=(20, 30))
+    classifier.quantize_features = True
+    classifier.classes = ["background", "filament"]
+    train_classifier(classifier, n_points=40)
+    classifier.predict()
+    path = str(tmp_path / "model.joblib")
+    classifier.save(path)
+    loaded = PixelClassifier.load(path, classifier.image)
+    loaded.predict()
+    assert loaded.classes == classifier.classes
+    assert loaded.sigma_max == classifier.sigma_max
+    assert np.array_equal(loaded.quantizer.scale, classifier.quantizer.scale)
+    assert np.array_equal(loaded.result, classifier.result)
+
+
+def test_training_points_are_rasterized_by_class():
+    classifier = create_classifier(shape=(20, 30))
+    classifier.classes = ["filament"]
+    classifier.training_points = [[1.2, 2.7], [5, 6], [30, 3], [-1, 4]]
+    classifier.training_points_classes = ["background", "filament",
+                                          "filament", "background"]
+    classifier.calculate_training_labels()
+    assert classifier.classes == ["filament", "background"]
+    assert np.count_nonzero(classifier.training_labels) == 2
+    assert classifier.training_labels[1, 3] == 2
+    assert classifier.training_labels[5, 6] == 1
+
+
+def test_benchmark_compares_the_backends():
+    benchmark = PixelClassifierBenchmark(["random forest", "logistic regression"])
+    benchmark.dataset = SyntheticFilaments(shape=(16, 48, 48))
+    benchmark.sigma_max = 2
+    benchmark.n_training_points = 300
+    benchmark.run()
+    assert benchmark.table["backend"] == ["random forest", "logistic regression"]
+    assert all(accuracy > 0.8 for accuracy in benchmark.table["accuracy"])
@@ -0,0 +1,57 @@
+import numpy as np
+from scipy.ndimage import gaussian_filter
+from skimage.filters import sato
+
+from filament_toolbox.lib.filter import GaussianFilter
+from filament_toolbox.lib.filter import SatoFilter
+from filament_toolbox.lib.operation import OutputPolicy
+from filament_toolbox.lib.operation import get_number_of_steps
+from filament_toolbox.lib.operation import release_arrays
+from filament_toolbox.lib.operation import run_steps
+
+
+def test_operations_run_step_by_step_like_in_one_go():
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 255, (10, 20, 30)).astype(np.uint8)
+    gaussian = GaussianFilter(image)
+    assert len(list(run_steps(gaussian))) == get_number_of_steps(gaussian)
+    assert np.array_equal(
+        gaussian.result, gaussian_filter(image, gaussian.get_sigma())
+    )
+    image = rng.random((30, 40))
+    ridges = SatoFilter(image)
+    steps = run_steps(ridges)
+    next(steps)
+    steps.close()
+    assert get_number_of_steps(ridges) == len(ridges.sigmas)
+    ridges.run()
+    assert np.allclose(
+        ridges.result, sato(image, sigmas=ridges.sigmas, black_ridges=False)
+    )
+
+
+def test_output_policy_converts_and_releases_results():
+    operation = GaussianFilter(np.array([[-3.2, 4.6], [300.0, 7.0]]))
+    operation.sigma = (0, 0, 0)
+    operation.run()
+    policy = OutputPolicy(dtype="uint8")
+    assert policy.convert(operation.result).tolist() == [[0, 7], [255, 9]]
+    assert OutputPolicy().convert(operation.result) is operation.result
+    release_arrays(operation)
+    assert operation.image is None and operation.result is None
+    assert operation.sigma == (0, 0, 0)
+
+
+def test_output_policy_clips_integers_and_stretches_floats():
+    integers = np.array([100, 300, 70000], dtype=np.int64)
+    assert OutputPolicy(dtype="uint8").convert(integers).tolist() == [100, 255, 255]
+    assert OutputPolicy(dtype="uint16").convert(integers).tolist() == [100, 300, 65535]
+    responses = np.array([0, 1e-3, 2e-3], dtype=np.float32)
+    assert OutputPolicy(dtype="uint8").convert(responses).tolist() == [0, 128, 255]
+
+
+def test_output_policy_converts_labels_only_if_they_fit():
+    labels = np.array([[0, 1], [2, 300]], dtype=np.int32)
+    assert OutputPolicy(dtype="uint16").convert_labels(labels).dtype == np.uint16
+    assert OutputPolicy(dtype="uint8").convert_labels(labels) is labels
+    assert OutputPolicy(dtype="float32").convert_labels(labels) is labels
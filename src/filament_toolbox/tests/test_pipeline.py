@@ -0,0 +1,23 @@
+import numpy as np
+from scipy.ndimage import gaussian_filter
+from skimage.measure import label
+
+from filament_toolbox.lib.pipeline import Pipeline
+
+
+def test_pipeline_chains_the_results_of_the_steps():
+    rng = np.random.default_rng(0)
+    image = rng.random((20, 30))
+    pipeline = Pipeline.from_dict({
+        "steps": [
+            {"operation": "GaussianFilter", "sigma": [1, 1, 1]},
+            {"operation": "Threshold", "min_value": 0.5, "output": "mask"},
+            {"operation": "Label", "connectivity": 1},
+        ]
+    })
+    pipeline.image = image
+    pipeline.run()
+    mask = gaussian_filter(image, 1) >= 0.5
+    assert np.array_equal(pipeline.images["mask"] > 0, mask)
+    assert np.array_equal(pipeline.result, label(mask, connectivity=1))
+    assert Pipeline.from_dict(pipeline.to_dict()).to_dict() == pipeline.to_dict()
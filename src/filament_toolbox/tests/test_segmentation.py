@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from filament_toolbox.lib.segmentation import Threshold
+
+
+def create_threshold():
+    image = np.random.default_rng(0).integers(0, 256, (5, 7, 13), dtype=np.uint8)
+    threshold = Threshold(image)
+    threshold.min_value = 100
+    threshold.chunk_voxels = 100
+    return threshold
+
+
+def test_threshold_writes_a_uint8_mask():
+    threshold = create_threshold()
+    threshold.run()
+    assert threshold.result.dtype == np.uint8
+    assert np.array_equal(threshold.result == 255, threshold.image >= 100)
+    assert np.array_equal(threshold.result > 0, threshold.result == 255)
+
+
+def test_threshold_writes_a_bool_mask():
+    threshold = create_threshold()
+    threshold.dtype = bool
+    threshold.max_value = 200
+    threshold.run()
+    assert threshold.result.dtype == bool
+    expected = (threshold.image >= 100) & (threshold.image <= 200)
+    assert np.array_equal(threshold.result, expected)
+
+
+def test_threshold_writes_a_bit_packed_mask():
+    threshold = create_threshold()
+    threshold.bit_packed = True
+    threshold.run()
+    assert threshold.result.shape == (5, 7, 2)
+    mask = Threshold.unpack(threshold.result, threshold.image.shape)
+    assert np.array_equal(mask, threshold.image >= 100)
+
+
+def test_threshold_writes_into_a_zarr_array(tmp_path):
+    zarr = pytest.importorskip("zarr")
+    threshold = create_threshold()
+    threshold.output = zarr.open_array(
+        str(tmp_path / "mask.zarr"), mode="w", shape=threshold.image.shape,
+        dtype=np.uint8, chunks=(1, 7, 13),
+    )
+    threshold.run()
+    assert np.array_equal(threshold.output[:] == 255, threshold.image >= 100)
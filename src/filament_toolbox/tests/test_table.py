@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from filament_toolbox.lib.table import ResultsTable
+
+
+def test_results_table_reads_like_columns_and_saves_csv(tmp_path):
+    table = ResultsTable({"label": np.array([1, 4]), "area": [2.5, 7.0]})
+    assert list(table.keys()) == ["label", "area"]
+    assert table.getRowCount() == 2
+    assert table.getValue(1, 0) == 4
+    np.testing.assert_array_equal(table["area"], [2.5, 7.0])
+    path = tmp_path / "table.csv"
+    table.save(str(path))
+    pd.testing.assert_frame_equal(pd.read_csv(path), table.dataFrame)
+
+
+def test_results_table_pads_shorter_columns_with_nan():
+    table = ResultsTable({"image1": ["a", "b"], "Dice": [0.5, 0.7],
+                          "clDice": [0.9]})
+    assert table.getRowCount() == 2
+    assert np.isnan(table["clDice"][1])